@@ -1,7 +1,14 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine, Base, SessionLocal
-from .routes import auth, students, rankings
+from .database import engine, async_engine, Base, SessionLocal
+from .routes import auth, students, rankings, jobs
+from .services.http_client import create_http_client, set_http_client
+from .services.http_cache import validator_cache
+from .services.moodle_service import close_transport as close_moodle_transport
+from .services.history_service import ensure_history
+from .services.ranking_service import ensure_rankings
+from .services.job_queue import worker_pool
+from .services.refresh_scheduler import REFRESH_TICK_SECONDS, run_due_refreshes, run_history_compaction, step_down
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from contextlib import asynccontextmanager
 import logging
@@ -16,35 +23,52 @@ Base.metadata.create_all(bind=engine)
 # Initialize scheduler
 scheduler = AsyncIOScheduler()
 
-async def scheduled_stats_update():
-    """Background job to update all student stats."""
-    logger.info("Starting scheduled stats update...")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup
+    # One pooled client shared by all external stat providers
+    app.state.http_client = create_http_client()
+    set_http_client(app.state.http_client)
+
     db = SessionLocal()
     try:
-        from .routes.rankings import update_student_data
-        await update_student_data(db)
-        logger.info("Scheduled stats update completed successfully")
-    except Exception as e:
-        logger.error(f"Error in scheduled stats update: {e}")
+        ensure_rankings(db)
+        ensure_history(db)
     finally:
         db.close()
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Startup
+    # Students are refreshed as they come due rather than in one hourly sweep.
+    # Every worker process ticks; a DB lease makes only one of them the scheduler.
     scheduler.add_job(
-        scheduled_stats_update,
+        run_due_refreshes,
         'interval',
-        hours=1,
-        id='stats_update_job',
+        seconds=REFRESH_TICK_SECONDS,
+        id='adaptive_refresh_job',
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
+    scheduler.add_job(
+        run_history_compaction,
+        'cron',
+        hour=3,
+        id='history_compaction_job',
         replace_existing=True
     )
     scheduler.start()
-    logger.info("Scheduler started - stats will update every hour")
+    logger.info(f"Scheduler started - due students are refreshed every {REFRESH_TICK_SECONDS}s")
+    worker_pool.start()
     yield
     # Shutdown
+    await worker_pool.stop()
     scheduler.shutdown()
+    await step_down()
     logger.info("Scheduler shut down")
+    set_http_client(None)
+    await app.state.http_client.aclose()
+    await close_moodle_transport()
+    validator_cache.save()
+    await async_engine.dispose()
 
 app = FastAPI(
     title="KIETMap API",
@@ -63,11 +87,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Stats-Age"],
 )
 
 app.include_router(auth.router)
 app.include_router(students.router)
 app.include_router(rankings.router)
+app.include_router(jobs.router)
 
 @app.get("/")
 def read_root():
@@ -1,7 +1,12 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Index, UniqueConstraint, text
 from sqlalchemy.sql import func
 from .database import Base
 
+# Student.stats_status values
+STATS_PENDING = "pending"  # registered, first fetch still running
+STATS_READY = "ready"
+STATS_FAILED = "failed"  # first fetch failed; the next refresh retries
+
 class Student(Base):
     __tablename__ = "students"
 
@@ -30,6 +35,156 @@ class Student(Base):
     gmail_photo_url = Column(String, nullable=True)
     github_commits_count = Column(Integer, default=0)
     leetcode_points = Column(Integer, default=0)
+    stats_status = Column(String, nullable=True, default=STATS_READY)
+    last_refreshed_at = Column(DateTime(timezone=True), nullable=True)  # last successful stats fetch
+    next_refresh_at = Column(DateTime(timezone=True), nullable=True, index=True)  # null = due now
+    refresh_interval = Column(Integer, nullable=True)  # seconds, grows while counts stay unchanged
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        # Directory pages (keyset on roll_number) and per-section leaderboards
+        Index("ix_students_section_roll_number", "section", "roll_number"),
+        Index("ix_students_section_github_commits_count", "section", "github_commits_count"),
+        Index("ix_students_section_leetcode_points", "section", "leetcode_points"),
+    )
+
+
+class StudentRanking(Base):
+    """Materialized leaderboard position of a student for one metric within one scope."""
+    __tablename__ = "student_rankings"
+
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), nullable=False, index=True)
+    metric = Column(String, nullable=False)  # github, leetcode
+    scope = Column(String, nullable=False)  # all, or a section (A, B, C, D)
+
+    value = Column(Integer, nullable=False, default=0)
+    rank = Column(Integer, nullable=False)  # 1 + number of students with a higher value
+    dense_rank = Column(Integer, nullable=False)  # 1 + number of distinct higher values
+    # No stored percentile: it depends on the board size, so it is computed when read
+
+    __table_args__ = (
+        UniqueConstraint("student_id", "metric", "scope", name="uq_student_rankings_student_metric_scope"),
+        Index("ix_student_rankings_board", "metric", "scope", "rank"),
+        Index("ix_student_rankings_value", "metric", "scope", "value"),
+    )
+
+
+class StatsHistory(Base):
+    """
+    Append-only change log of a student's stats: a row is written only when a
+    value changes, so each row holds the value from recorded_at until the next
+    row. Rows older than HISTORY_RAW_DAYS are thinned to the last one per day.
+    """
+    __tablename__ = "stats_history"
+
+    id = Column(Integer, primary_key=True)
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), nullable=False)
+    metric = Column(String, nullable=False)  # github, leetcode
+    value = Column(Integer, nullable=False)
+    recorded_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        # Per-student trend lookups
+        Index("ix_stats_history_student_metric_time", "student_id", "metric", "recorded_at"),
+        # Leaderboard window scans
+        Index("ix_stats_history_metric_time", "metric", "recorded_at"),
+    )
+
+
+class MoodleAssignmentsCache(Base):
+    """Last scraped MoodleAssignmentsResponse of a student, served while it is refreshed."""
+    __tablename__ = "moodle_assignments_cache"
+
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), primary_key=True)
+    payload = Column(Text, nullable=False)  # JSON {"pending": [...], "completed": [...]}
+    fetched_at = Column(DateTime(timezone=True), nullable=False)  # last successful scrape
+    checked_at = Column(DateTime(timezone=True), nullable=False)  # last scrape attempt
+    moodle_down = Column(Boolean, nullable=False, default=False)  # last attempt found Moodle unreachable
+
+
+class MoodleCalendarFeed(Base):
+    """
+    A student's Moodle calendar export (iCal) URL and the events last synced
+    from it. With a feed, assignments are read from the calendar export without
+    logging in.
+    """
+    __tablename__ = "moodle_calendar_feeds"
+
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), primary_key=True)
+    url = Column(Text, nullable=False)  # carries Moodle's authtoken; never exposed
+    course_map = Column(Text, nullable=False, default="{}")  # JSON course -> teacher, from the dashboard
+    events = Column(Text, nullable=False, default="{}")  # JSON UID -> processed event
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    synced_at = Column(DateTime(timezone=True), nullable=True)
+
+
+# RefreshJob.kind / RefreshJob.status values
+JOB_SWEEP = "sweep"
+JOB_STUDENT = "student"
+JOB_SHARD = "shard"  # a slice of due students, see refresh_scheduler
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+class RefreshJob(Base):
+    """Durable unit of stats refresh work, picked up by the job workers."""
+    __tablename__ = "refresh_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)  # sweep, student, shard
+    student_id = Column(Integer, ForeignKey("students.id", ondelete="CASCADE"), nullable=True)
+    student_ids = Column(Text, nullable=True)  # JSON list, shard jobs only
+    # Jobs with the same key are the same work; only one of them can be active
+    dedup_key = Column(String, nullable=False)
+    status = Column(String, nullable=False, default=JOB_QUEUED)
+
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime(timezone=True), nullable=False)
+
+    progress_done = Column(Integer, nullable=False, default=0)
+    progress_total = Column(Integer, nullable=False, default=0)
+    result = Column(Text, nullable=True)  # JSON summary
+    error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Set by the worker running the job and renewed while it runs; a running
+    # job whose lease expired belongs to a dead worker and is requeued
+    locked_by = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_refresh_jobs_status_run_after", "status", "run_after"),
+        Index(
+            "uq_refresh_jobs_active_dedup_key",
+            "dedup_key",
+            unique=True,
+            postgresql_where=text("status IN ('queued', 'running')"),
+            sqlite_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+
+class Lease(Base):
+    """Named, expiring ownership claim shared by all app processes (e.g. scheduler leadership)."""
+    __tablename__ = "leases"
+
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class CacheGeneration(Base):
+    """Shared generation counter of a response cache namespace, bumped by any app process."""
+    __tablename__ = "cache_generations"
+
+    namespace = Column(String, primary_key=True)
+    generation = Column(Integer, nullable=False, default=0)
@@ -1,8 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ..database import get_db
-from ..models import Student
+from ..database import get_db, get_async_db
+from ..models import Student, STATS_PENDING, STATS_READY, JOB_STUDENT
 from ..schemas import StudentCreate, StudentResponse
+from ..services.ranking_service import add_to_rankings, ranking_write_lock
+from ..services.response_cache import DIRECTORY, RANKINGS, response_cache
+from ..services.job_queue import enqueue_job
+from ..services.refresh_policy import REFRESH_RETRY_DELAY
+from ..services.timeutil import utcnow
+from datetime import timedelta
 
 router = APIRouter(
     prefix="/api/auth",
@@ -11,16 +19,17 @@ router = APIRouter(
 
 
 @router.post("/register", response_model=StudentResponse, status_code=status.HTTP_201_CREATED)
-async def register_student(student: StudentCreate, db: Session = Depends(get_db)):
+async def register_student(student: StudentCreate, db: AsyncSession = Depends(get_async_db)):
     # Check if email already exists
-    db_student_email = db.query(Student).filter(Student.email == student.email).first()
+    db_student_email = (await db.execute(select(Student.id).where(Student.email == student.email))).first()
     if db_student_email:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Check if roll number already exists
-    db_student_roll = db.query(Student).filter(Student.roll_number == student.roll_number).first()
+    db_student_roll = (await db.execute(select(Student.id).where(Student.roll_number == student.roll_number))).first()
     if db_student_roll:
         raise HTTPException(status_code=400, detail="Roll number already registered")
+
     
     # Create new student
     student_data = student.model_dump()
@@ -39,18 +48,15 @@ async def register_student(student: StudentCreate, db: Session = Depends(get_db)
         if student_data.get(key):
             student_data[key] = str(student_data[key]).strip()
 
-    # Fetch Stats
-    from ..services.github_service import get_github_commits
-    from ..services.leetcode_service import get_leetcode_stats
+    # Stats are fetched in the background after the insert; until then the
+    # student shows up with zero counts and stats_status "pending"
     from ..services.gmail_service import get_gmail_photo
-    
-    if student_data.get('github_username'):
-        commits = await get_github_commits(student_data['github_username'])
-        student_data['github_commits_count'] = commits if commits is not None else 0
-        
-    if student_data.get('leetcode_username'):
-        points = await get_leetcode_stats(student_data['leetcode_username'])
-        student_data['leetcode_points'] = points if points is not None else 0
+
+    has_profiles = bool(student_data.get('github_username') or student_data.get('leetcode_username'))
+    student_data['stats_status'] = STATS_PENDING if has_profiles else STATS_READY
+    if has_profiles:
+        # The registration job fetches them; keep the scheduler from queueing them too
+        student_data['next_refresh_at'] = utcnow() + timedelta(seconds=REFRESH_RETRY_DELAY)
         
     if student_data.get('email'):
         student_data['gmail_photo_url'] = await get_gmail_photo(
@@ -60,9 +66,18 @@ async def register_student(student: StudentCreate, db: Session = Depends(get_db)
 
     new_student = Student(**student_data)
     
-    db.add(new_student)
-    db.commit()
-    db.refresh(new_student)
+    async with ranking_write_lock:
+        db.add(new_student)
+        await db.flush()
+        # Ranked at the bottom with zero counts; no other row moves
+        await db.run_sync(add_to_rankings, new_student)
+        await db.commit()
+    response_cache.bump(DIRECTORY, RANKINGS)
+    await db.refresh(new_student)
+
+    if has_profiles:
+        # Picked up by the job workers; retried with backoff if a provider fails
+        await enqueue_job(db, JOB_STUDENT, new_student.id)
     return new_student
 
 @router.get("/verify-email/{email}")
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from ..database import get_db
+from ..models import RefreshJob
+from ..schemas import JobResponse, JobProgressResponse
+
+router = APIRouter(
+    prefix="/api/jobs",
+    tags=["Jobs"]
+)
+
+def _get_job(db: Session, job_id: int) -> RefreshJob:
+    job = db.query(RefreshJob).filter(RefreshJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/{job_id}", response_model=JobResponse)
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    return _get_job(db, job_id)
+
+@router.get("/{job_id}/progress", response_model=JobProgressResponse)
+def get_job_progress(job_id: int, db: Session = Depends(get_db)):
+    job = _get_job(db, job_id)
+    percent = 100.0 * job.progress_done / job.progress_total if job.progress_total else 0.0
+    return JobProgressResponse(
+        id=job.id,
+        status=job.status,
+        done=job.progress_done,
+        total=job.progress_total,
+        percent=round(percent, 1)
+    )
@@ -1,36 +1,118 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from datetime import timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from ..database import get_db
-from ..models import Student
-from ..schemas import StudentResponse
-from sqlalchemy import desc
+from typing import List, Optional
+from ..database import get_db, get_async_db
+from ..models import Student, StudentRanking, JOB_SWEEP
+from ..schemas import RankedStudentListItem, ImprovedStudentListItem, MetricEnum, SectionEnum
+from ..services.projection import COMPACT_FIELDS, dumps, parse_fields, student_columns
+from ..services.job_queue import enqueue_job
+from ..services.history_service import window_baselines
+from ..services.ranking_service import ALL_SCOPE, METRICS, percentile
+from ..services.response_cache import RANKINGS, cached_json_response
+from ..services.timeutil import utcnow
 
 router = APIRouter(
     prefix="/api/rankings",
     tags=["Rankings"]
 )
 
-@router.get("/github", response_model=List[StudentResponse])
-def get_github_rankings(limit: int = 1000, db: Session = Depends(get_db)):
-    return db.query(Student).order_by(desc(Student.github_commits_count)).limit(limit).all()
+def _ranked_students(db: Session, metric: str, section: Optional[SectionEnum], limit: int, fields: List[str]):
+    # Reads the precomputed ranking table via its (metric, scope, rank) index and
+    # loads only the requested student columns
+    scope = section.value if section else ALL_SCOPE
+    board = db.query(StudentRanking).filter(StudentRanking.metric == metric, StudentRanking.scope == scope)
+    rows = (
+        board.with_entities(
+            StudentRanking.rank,
+            StudentRanking.dense_rank,
+            *student_columns(fields)
+        )
+        .join(Student, Student.id == StudentRanking.student_id)
+        .order_by(StudentRanking.rank, StudentRanking.student_id)
+        .limit(limit)
+        .all()
+    )
+    total = board.count() if rows else 0
+    return [{**row._asdict(), "percentile": percentile(row.rank, total)} for row in rows]
 
-@router.get("/leetcode", response_model=List[StudentResponse])
-def get_leetcode_rankings(limit: int = 1000, db: Session = Depends(get_db)):
-    return db.query(Student).order_by(desc(Student.leetcode_points)).limit(limit).all()
+def _cached_rankings(
+    request: Request,
+    db: Session,
+    metric: str,
+    section: Optional[SectionEnum],
+    limit: int,
+    fields: Optional[str]
+):
+    selected = parse_fields(fields) or COMPACT_FIELDS
+    return cached_json_response(
+        request,
+        RANKINGS,
+        (metric, section, limit, tuple(selected)),
+        lambda: dumps(_ranked_students(db, metric, section, limit, selected))
+    )
+
+@router.get("/github", response_model=List[RankedStudentListItem])
+def get_github_rankings(
+    request: Request,
+    section: Optional[SectionEnum] = None,
+    limit: int = 1000,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    return _cached_rankings(request, db, "github", section, limit, fields)
+
+@router.get("/leetcode", response_model=List[RankedStudentListItem])
+def get_leetcode_rankings(
+    request: Request,
+    section: Optional[SectionEnum] = None,
+    limit: int = 1000,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    return _cached_rankings(request, db, "leetcode", section, limit, fields)
+
+def _most_improved(db: Session, metric: str, section: Optional[SectionEnum], days: int, limit: int):
+    # Only students with history rows in the window can have gained anything,
+    # so the window scan on (metric, recorded_at) bounds the work
+    since = utcnow() - timedelta(days=days)
+    baselines = window_baselines(db, metric, since, section.value if section else None)
+    if not baselines:
+        return []
+
+    column = METRICS[metric].key
+    rows = db.query(*student_columns(COMPACT_FIELDS)).filter(Student.id.in_(list(baselines))).all()
+    items = []
+    for row in rows:
+        item = row._asdict()
+        current = item[column] or 0
+        start = baselines[item["id"]]
+        if current > start:
+            item.update(start_value=start, current_value=current, gain=current - start)
+            items.append(item)
+    items.sort(key=lambda item: (-item["gain"], item["roll_number"]))
+    return items[:limit]
+
+@router.get("/most-improved", response_model=List[ImprovedStudentListItem])
+def get_most_improved(
+    request: Request,
+    metric: MetricEnum = MetricEnum.github,
+    section: Optional[SectionEnum] = None,
+    days: int = Query(7, ge=1, le=365),
+    limit: int = 20,
+    db: Session = Depends(get_db)
+):
+    """Students with the largest gain in the metric over the last `days` days (a week by default)."""
+    return cached_json_response(
+        request,
+        RANKINGS,
+        ("most-improved", metric.value, section, days, limit),
+        lambda: dumps(_most_improved(db, metric.value, section, days, limit))
+    )
 
 @router.post("/refresh")
-def refresh_rankings(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    # TODO: Trigger background task to update data from external APIs
-    background_tasks.add_task(update_student_data, db)
-    return {"message": "Ranking refresh triggered"}
-
-from ..services.stats_service import update_student_stats
-import asyncio
-
-async def update_student_data(db: Session):
-    students = db.query(Student).all()
-    for student in students:
-        await update_student_stats(db, student)
-        # Add a small delay to avoid hitting rate limits too hard
-        await asyncio.sleep(1)
+async def refresh_rankings(db: AsyncSession = Depends(get_async_db)):
+    # Queues a full sweep; triggers while one is queued or running share that job
+    job = await enqueue_job(db, JOB_SWEEP)
+    return {"message": "Ranking refresh triggered", "job_id": job.id, "status": job.status}
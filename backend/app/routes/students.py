@@ -1,11 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import base64
+import binascii
+import os
+from datetime import timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from ..database import get_db
-from ..models import Student
-from ..schemas import StudentResponse, SectionEnum, StudentUpdate
+from ..database import AsyncSessionLocal, get_db, get_async_db
+from ..models import MoodleAssignmentsCache, MoodleCalendarFeed, Student
+from ..schemas import StudentResponse, SectionEnum, StudentUpdate, StatsStatusResponse, MetricEnum, StudentTrendResponse, TrendPoint
 from ..services.stats_service import update_student_stats
-from ..services.moodle_service import MoodleClient
+from ..services.history_service import student_trend
+from ..services.ranking_service import rebuild_rankings
+from ..services.projection import dumps, parse_fields, student_columns
+from ..services.response_cache import DIRECTORY, RANKINGS, cached_json_response, response_cache
+from ..services.singleflight import SingleFlight
+from ..services.timeutil import age_seconds, utcnow
+from ..services import assignments_cache
+from ..services.moodle_service import MoodleUnavailableError
 from ..schemas import MoodleAssignmentsResponse
 
 
@@ -14,17 +28,65 @@ router = APIRouter(
     tags=["Students"]
 )
 
+_student_list = TypeAdapter(List[StudentResponse])
+
+def encode_cursor(roll_number: str) -> str:
+    return base64.urlsafe_b64encode(roll_number.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return base64.urlsafe_b64decode(padded.encode()).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @router.get("/", response_model=List[StudentResponse])
 def get_students(
+    request: Request,
     section: Optional[SectionEnum] = None,
     skip: int = 0,
     limit: int = 100,
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    query = db.query(Student)
-    if section:
-        query = query.filter(Student.section == section.value)
-    return query.order_by(Student.roll_number).offset(skip).limit(limit).all()
+    """
+    Lists students ordered by roll number. Pass the X-Next-Cursor header of a
+    page as `after` to get the next page; `skip` still works but gets slower
+    the deeper the page. `fields` (e.g. fields=name,section,gmail_photo_url)
+    returns only those columns; `id` is always included.
+    """
+    after_roll_number = decode_cursor(after) if after else None
+    selected = parse_fields(fields)
+
+    def build():
+        if selected:
+            query = db.query(*student_columns(selected), Student.roll_number.label("_cursor"))
+        else:
+            query = db.query(Student)
+        if section:
+            query = query.filter(Student.section == section.value)
+        query = query.order_by(Student.roll_number)
+        if after_roll_number is not None:
+            # Keyset pagination: seeks on the (section, roll_number) index
+            query = query.filter(Student.roll_number > after_roll_number)
+        else:
+            query = query.offset(skip)
+        students = query.limit(limit).all()
+
+        headers = {}
+        if students and len(students) == limit:
+            last = students[-1]
+            headers["X-Next-Cursor"] = encode_cursor(last._cursor if selected else last.roll_number)
+
+        if selected:
+            rows = [{name: row._mapping[name] for name in selected} for row in students]
+            return dumps(rows), headers
+        body = _student_list.dump_json(_student_list.validate_python(students, from_attributes=True))
+        return body, headers
+
+    cache_key = (section, skip, limit, after_roll_number, tuple(selected) if selected else None)
+    return cached_json_response(request, DIRECTORY, cache_key, build)
 
 @router.get("/{roll_number}", response_model=StudentResponse)
 def get_student(roll_number: str, db: Session = Depends(get_db)):
@@ -33,13 +95,72 @@ def get_student(roll_number: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Student not found")
     return student
 
+@router.get("/{roll_number}/stats-status", response_model=StatsStatusResponse)
+def get_stats_status(roll_number: str, db: Session = Depends(get_db)):
+    """Lets the client poll until the stats fetched after registration are in."""
+    row = db.query(
+        Student.roll_number,
+        Student.stats_status,
+        Student.github_commits_count,
+        Student.leetcode_points
+    ).filter(Student.roll_number == roll_number).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Student not found")
+    return row
+
+@router.get("/{roll_number}/trend", response_model=StudentTrendResponse)
+def get_student_trend(
+    roll_number: str,
+    metric: MetricEnum = MetricEnum.github,
+    days: int = Query(90, ge=1, le=365),
+    db: Session = Depends(get_db)
+):
+    """
+    The student's recorded values over the last `days` days, oldest first. The
+    first point carries the value at the start of the window; each point holds
+    until the next one.
+    """
+    student_id = db.query(Student.id).filter(Student.roll_number == roll_number).scalar()
+    if student_id is None:
+        raise HTTPException(status_code=404, detail="Student not found")
+    rows = student_trend(db, student_id, metric.value, utcnow() - timedelta(days=days))
+    return StudentTrendResponse(
+        roll_number=roll_number,
+        metric=metric.value,
+        points=[TrendPoint.model_validate(row) for row in rows]
+    )
+
+# Per-student refreshes closer together than this return the stored stats instead
+STUDENT_REFRESH_MIN_INTERVAL = float(os.getenv("STUDENT_REFRESH_MIN_INTERVAL", "300"))
+
+# Concurrent refreshes of the same student share one upstream fetch
+_refresh_flight = SingleFlight()
+
+async def _refresh_student(student_id: int) -> StudentResponse:
+    async with AsyncSessionLocal() as db:
+        student = await db.get(Student, student_id)
+        student = await update_student_stats(db, student)
+        return StudentResponse.model_validate(student)
+
 @router.post("/{roll_number}/refresh", response_model=StudentResponse)
-async def refresh_student_stats(roll_number: str, db: Session = Depends(get_db)):
-    student = db.query(Student).filter(Student.roll_number == roll_number).first()
+async def refresh_student_stats(roll_number: str, response: Response, db: AsyncSession = Depends(get_async_db)):
+    """
+    Fetches fresh stats for one student. Within STUDENT_REFRESH_MIN_INTERVAL of
+    the last successful fetch the stored stats are returned as they are; the
+    X-Stats-Age header says how old they are in seconds.
+    """
+    student = (await db.execute(select(Student).where(Student.roll_number == roll_number))).scalar_one_or_none()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
-    
-    updated_student = await update_student_stats(db, student)
+    await db.commit()
+
+    age = age_seconds(student.last_refreshed_at)
+    if age is not None and age < STUDENT_REFRESH_MIN_INTERVAL and not _refresh_flight.in_flight(student.id):
+        response.headers["X-Stats-Age"] = str(int(age))
+        return student
+
+    updated_student = await _refresh_flight.do(student.id, lambda: _refresh_student(student.id))
+    response.headers["X-Stats-Age"] = str(int(age_seconds(updated_student.last_refreshed_at) or 0))
     return updated_student
 
 @router.put("/{roll_number}", response_model=StudentResponse)
@@ -49,18 +170,39 @@ def update_student(roll_number: str, student_update: StudentUpdate, db: Session
         raise HTTPException(status_code=404, detail="Student not found")
     
     update_data = student_update.dict(exclude_unset=True)
+    # Convert Enum to string
+    if update_data.get('section') is not None:
+        update_data['section'] = update_data['section'].value
+    old_section = db_student.section
+    old_moodle_login = (db_student.moodle_username, db_student.moodle_password)
     for key, value in update_data.items():
         setattr(db_student, key, value)
+
+    if (db_student.moodle_username, db_student.moodle_password) != old_moodle_login:
+        # Cached assignments and the calendar feed may belong to the old Moodle account
+        for model in (MoodleAssignmentsCache, MoodleCalendarFeed):
+            db.query(model).filter(model.student_id == db_student.id).delete(synchronize_session=False)
+
+    if db_student.section != old_section:
+        # Moving sections changes two section leaderboards
+        db.flush()
+        rebuild_rankings(db, [old_section, db_student.section])
     
     db.commit()
+    response_cache.bump(DIRECTORY, RANKINGS)
     db.refresh(db_student)
     db.commit()
     db.refresh(db_student)
     return db_student
 
 @router.get("/{roll_number}/moodle-assignments", response_model=MoodleAssignmentsResponse)
-def get_moodle_assignments(roll_number: str, db: Session = Depends(get_db)):
-    student = db.query(Student).filter(Student.roll_number == roll_number).first()
+async def get_moodle_assignments(roll_number: str, db: AsyncSession = Depends(get_async_db)):
+    """
+    Returns the student's cached assignments right away; `age_seconds`, `stale`
+    and `moodle_down` say how fresh they are. Stale results are refreshed in
+    the background, so only the first view waits for Moodle.
+    """
+    student = (await db.execute(select(Student).where(Student.roll_number == roll_number))).scalar_one_or_none()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
@@ -68,12 +210,12 @@ def get_moodle_assignments(roll_number: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Moodle credentials not provided")
         
     try:
-        client = MoodleClient(student.moodle_username, student.moodle_password)
-        assignments = client.get_assignments() 
-        return assignments
+        return await assignments_cache.get_assignments(db, student)
     except ValueError as e:
         if "Login failed" in str(e):
             raise HTTPException(status_code=401, detail="Invalid Moodle credentials")
         raise HTTPException(status_code=500, detail="Failed to fetch assignments")
+    except MoodleUnavailableError:
+        raise HTTPException(status_code=503, detail="Moodle is unavailable")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -47,12 +47,87 @@ class StudentResponse(StudentBase):
     gmail_photo_url: Optional[str] = None
     github_commits_count: int = 0
     leetcode_points: int = 0
+    stats_status: Optional[str] = None
+    last_refreshed_at: Optional[datetime] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
+class StudentListItem(BaseModel):
+    """Compact row for lists and leaderboards, without profile text, links or credentials."""
+    id: int
+    roll_number: str
+    name: str
+    section: str
+    gmail_photo_url: Optional[str] = None
+    github_username: Optional[str] = None
+    leetcode_username: Optional[str] = None
+    github_commits_count: int = 0
+    leetcode_points: int = 0
+
+class RankedStudentListItem(StudentListItem):
+    rank: int
+    dense_rank: int
+    percentile: float
+
+class MetricEnum(str, Enum):
+    github = "github"
+    leetcode = "leetcode"
+
+class ImprovedStudentListItem(StudentListItem):
+    start_value: int
+    current_value: int
+    gain: int
+
+class TrendPoint(BaseModel):
+    recorded_at: datetime
+    value: int
+
+    class Config:
+        from_attributes = True
+
+class StudentTrendResponse(BaseModel):
+    roll_number: str
+    metric: str
+    points: List[TrendPoint]
+
+class StatsStatusResponse(BaseModel):
+    roll_number: str
+    stats_status: Optional[str] = None
+    github_commits_count: int = 0
+    leetcode_points: int = 0
+
+    class Config:
+        from_attributes = True
+
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    student_id: Optional[int] = None
+    status: str
+    attempts: int
+    max_attempts: int
+    progress_done: int = 0
+    progress_total: int = 0
+    result: Optional[str] = None
+    error: Optional[str] = None
+    run_after: datetime
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class JobProgressResponse(BaseModel):
+    id: int
+    status: str
+    done: int
+    total: int
+    percent: float
+
 class Assignment(BaseModel):
     title: str
     course: str
@@ -62,3 +137,6 @@ class Assignment(BaseModel):
 class MoodleAssignmentsResponse(BaseModel):
     pending: List[Assignment]
     completed: List[Assignment]
+    age_seconds: float = 0.0  # since the assignments were scraped
+    stale: bool = False  # older than MOODLE_CACHE_TTL, a refresh is under way
+    moodle_down: bool = False  # the last refresh could not reach Moodle
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional, Set, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import AsyncSessionLocal
+from ..models import MoodleAssignmentsCache, MoodleCalendarFeed, Student
+from ..schemas import MoodleAssignmentsResponse
+from .moodle_calendar import InvalidFeedError, sync_feed
+from .moodle_service import MoodleUnavailableError, moodle_sessions
+from .singleflight import SingleFlight
+from .timeutil import age_seconds, utcnow
+
+logger = logging.getLogger(__name__)
+
+# Cached assignments older than this are served as stale and refreshed in the background
+MOODLE_CACHE_TTL = float(os.getenv("MOODLE_CACHE_TTL", "1800"))
+# Minimum seconds between background refresh attempts, so an outage isn't hammered
+MOODLE_RETRY_AFTER = float(os.getenv("MOODLE_RETRY_AFTER", "300"))
+# Calendar feeds are set up again (new token, fresh course -> teacher map) after this long
+MOODLE_FEED_MAX_AGE = float(os.getenv("MOODLE_FEED_MAX_AGE", str(7 * 86400)))
+
+# Concurrent refreshes of the same student share one scrape
+_refresh_flight = SingleFlight()
+# Keeps background refresh tasks referenced until they finish
+_background_tasks: Set[asyncio.Task] = set()
+# Students whose Moodle wouldn't hand out an export URL -> when that was tried
+_export_unavailable: Dict[int, float] = {}
+
+async def _scrape(student_id: int, username: str, password: str) -> Tuple[dict, Optional[str], Dict[str, str]]:
+    """Scrapes the HTML pages; also asks for the calendar export URL, unless that failed recently."""
+    async with moodle_sessions.client(username, password) as client:
+        assignments = await client.get_assignments()
+        export_url = None
+        last_try = _export_unavailable.get(student_id)
+        if last_try is None or time.monotonic() - last_try > MOODLE_FEED_MAX_AGE:
+            try:
+                export_url = await client.get_calendar_export_url()
+            except Exception as e:
+                logger.warning(f"Calendar export URL lookup failed for student {student_id}: {e}")
+            if export_url is None:
+                _export_unavailable[student_id] = time.monotonic()
+            else:
+                _export_unavailable.pop(student_id, None)
+        return assignments, export_url, client.course_map
+
+async def _fetch(student_id: int, username: str, password: str) -> dict:
+    """
+    Reads the assignments from the student's iCal export when there is a feed:
+    one cookieless GET, no login and no HTML parsing. Otherwise (or when the
+    feed stopped working) scrapes Moodle and sets the feed up on the way.
+    """
+    async with AsyncSessionLocal() as db:
+        feed = await db.get(MoodleCalendarFeed, student_id)
+        await db.commit()
+
+        if feed is not None and age_seconds(feed.created_at) < MOODLE_FEED_MAX_AGE:
+            try:
+                assignments = await sync_feed(feed)
+                await db.commit()
+                return assignments
+            except InvalidFeedError as e:
+                logger.info(f"Calendar feed of student {student_id} stopped working ({e}), scraping instead")
+
+        assignments, export_url, course_map = await _scrape(student_id, username, password)
+        if export_url is not None:
+            if feed is None:
+                feed = MoodleCalendarFeed(student_id=student_id)
+                db.add(feed)
+            feed.url = export_url
+            feed.course_map = json.dumps(course_map)
+            feed.events = "{}"
+            feed.created_at = utcnow()
+            feed.synced_at = None
+        elif feed is not None:
+            await db.delete(feed)
+        await db.commit()
+        return assignments
+
+async def refresh_assignments(student_id: int, username: str, password: str) -> MoodleAssignmentsCache:
+    """Fetches the student's assignments into the cache. Failures are recorded on the entry and re-raised."""
+    checked_at = utcnow()
+    try:
+        assignments = await _fetch(student_id, username, password)
+    except Exception as e:
+        async with AsyncSessionLocal() as db:
+            entry = await db.get(MoodleAssignmentsCache, student_id)
+            if entry is not None:
+                entry.checked_at = checked_at
+                entry.moodle_down = isinstance(e, MoodleUnavailableError)
+                await db.commit()
+        raise
+
+    async with AsyncSessionLocal() as db:
+        entry = await db.get(MoodleAssignmentsCache, student_id)
+        if entry is None:
+            entry = MoodleAssignmentsCache(student_id=student_id)
+            db.add(entry)
+        entry.payload = json.dumps(assignments)
+        entry.fetched_at = checked_at
+        entry.checked_at = checked_at
+        entry.moodle_down = False
+        await db.commit()
+    return entry
+
+def _revalidate(student: Student):
+    student_id, username, password = student.id, student.moodle_username, student.moodle_password
+
+    async def run():
+        try:
+            await _refresh_flight.do(student_id, lambda: refresh_assignments(student_id, username, password))
+        except Exception as e:
+            logger.warning(f"Background Moodle refresh failed for student {student_id}: {e}")
+
+    task = asyncio.create_task(run())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+def _response(entry: MoodleAssignmentsCache) -> MoodleAssignmentsResponse:
+    age = age_seconds(entry.fetched_at)
+    return MoodleAssignmentsResponse(
+        **json.loads(entry.payload),
+        age_seconds=round(age, 1),
+        stale=age > MOODLE_CACHE_TTL,
+        moodle_down=entry.moodle_down
+    )
+
+async def get_assignments(db: AsyncSession, student: Student) -> MoodleAssignmentsResponse:
+    """
+    Stale-while-revalidate: returns the cached assignments at once and, when
+    they are older than MOODLE_CACHE_TTL, refreshes them in the background.
+    Only a student without a cache entry waits for the scrape, whose errors
+    (ValueError("Login failed"), MoodleUnavailableError) are raised.
+    """
+    entry = await db.get(MoodleAssignmentsCache, student.id)
+    await db.commit()
+
+    if entry is None:
+        entry = await _refresh_flight.do(
+            student.id,
+            lambda: refresh_assignments(student.id, student.moodle_username, student.moodle_password)
+        )
+    elif (
+        age_seconds(entry.fetched_at) > MOODLE_CACHE_TTL
+        and age_seconds(entry.checked_at) > MOODLE_RETRY_AFTER
+        and not _refresh_flight.in_flight(student.id)
+    ):
+        _revalidate(student)
+    return _response(entry)
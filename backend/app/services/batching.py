@@ -0,0 +1,48 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Looks up one batch of usernames. None means the batch failed in a way a
+# smaller batch may not (too large, too expensive, timed out), {} or a partial
+# dict means it is done; users left out fall back to the per-user paths.
+BatchFetch = Callable[[List[str]], Awaitable[Optional[Dict[str, int]]]]
+
+async def run_batches(
+    provider: str,
+    usernames: List[str],
+    batch_size: int,
+    concurrency: int,
+    fetch: BatchFetch
+) -> Dict[str, int]:
+    """
+    Runs fetch over the unique usernames in batches of batch_size, at most
+    `concurrency` at a time. A failed batch is retried in halves, down to
+    single users, so one bad query doesn't send the whole batch to the
+    per-user fallbacks.
+    """
+    unique = list(dict.fromkeys(u for u in usernames if u))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(batch: List[str]) -> Dict[str, int]:
+        async with semaphore:
+            try:
+                results = await fetch(batch)
+            except Exception as e:
+                logger.error(f"{provider} batch error: {e}")
+                results = None
+        if results is not None:
+            return results
+        if len(batch) == 1:
+            return {}
+        logger.info(f"{provider} batch of {len(batch)} failed, splitting")
+        middle = len(batch) // 2
+        first, second = await asyncio.gather(run(batch[:middle]), run(batch[middle:]))
+        return {**first, **second}
+
+    results = {}
+    batches = [unique[i:i + batch_size] for i in range(0, len(unique), batch_size)]
+    for batch_results in await asyncio.gather(*(run(batch) for batch in batches)):
+        results.update(batch_results)
+    return results
@@ -0,0 +1,81 @@
+import httpx
+import logging
+import os
+import time
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "60"))
+
+class ProviderError(Exception):
+    """Raised when a provider itself is failing (rate limited, 5xx), not the user lookup."""
+    pass
+
+def raise_for_provider_status(response: httpx.Response):
+    """Raises ProviderError for statuses that mean the provider is unhealthy or throttling us."""
+    if response.status_code in (403, 429) or response.status_code >= 500:
+        raise ProviderError(f"{response.request.url.host} returned {response.status_code}")
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. After failure_threshold consecutive failures the
+    breaker opens and calls are skipped. After reset_timeout it goes half-open
+    and lets a single probe through; the probe's result closes or re-opens it.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+            self._probing = False
+        # Half-open: only one probe at a time
+        if self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def release(self):
+        """Ends a call that neither proved nor disproved the provider's health."""
+        self._probing = False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit {self.name} closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit {self.name} opened after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Returns the shared circuit breaker for a provider."""
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT)
+    return _breakers[name]
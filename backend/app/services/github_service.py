@@ -1,91 +1,272 @@
 import httpx
+import logging
 import os
-from typing import Optional
+import re
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from .batching import run_batches
+from .circuit_breaker import ProviderError, get_breaker, raise_for_provider_status
+from .http_cache import validator_cache
+from .http_client import get_http_client
+from .rate_limiter import get_limiter
+
+logger = logging.getLogger(__name__)
 
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 
-async def get_github_commits(username: str) -> Optional[int]:
-    if not username:
-        return 0
-    
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
+# Users per aliased GraphQL query, and how many batch queries run at once
+GITHUB_GRAPHQL_BATCH_SIZE = int(os.getenv("GITHUB_GRAPHQL_BATCH_SIZE", "50"))
+GITHUB_GRAPHQL_BATCH_CONCURRENCY = int(os.getenv("GITHUB_GRAPHQL_BATCH_CONCURRENCY", "2"))
+# Stop batching when the remaining GraphQL budget drops below this many points
+GITHUB_GRAPHQL_MIN_REMAINING = int(os.getenv("GITHUB_GRAPHQL_MIN_REMAINING", "100"))
+
+# Last known GraphQL rate limit state, updated from every batch response
+graphql_budget = {"cost": None, "remaining": None, "reset_at": None}
+
+# username -> fetch method that last worked for that user
+GITHUB_METHOD_MEMO_SIZE = int(os.getenv("GITHUB_METHOD_MEMO_SIZE", "10000"))
+_method_memo: "OrderedDict[str, str]" = OrderedDict()
+
+SCRAPE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+def _api_headers() -> Dict[str, str]:
+    headers = dict(SCRAPE_HEADERS)
     if GITHUB_TOKEN:
         headers["Authorization"] = f"token {GITHUB_TOKEN}"
+    return headers
 
-    async with httpx.AsyncClient() as client:
-        # Method 1: GraphQL (Best, but requires Token)
-        if GITHUB_TOKEN:
-            try:
-                query = """
-                query($login: String!) {
-                    user(login: $login) {
-                        contributionsCollection {
-                            totalCommitContributions
-                        }
-                    }
-                }
-                """
-                response = await client.post(
-                    "https://api.github.com/graphql",
-                    json={"query": query, "variables": {"login": username}},
-                    headers=headers
-                )
-                if response.status_code == 200:
-                    data = response.json()
-                    if "data" in data and data["data"]["user"]:
-                        return data["data"]["user"]["contributionsCollection"]["totalCommitContributions"]
-            except Exception as e:
-                print(f"GitHub GraphQL Error: {e}")
-
-        # Method 2: Scraping (Fallback, works without token)
-        try:
-            import re
-            scrape_headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+async def _commits_via_graphql(username: str, client: httpx.AsyncClient) -> Optional[int]:
+    # Method 1: GraphQL (Best, but requires Token)
+    query = """
+    query($login: String!) {
+        user(login: $login) {
+            contributionsCollection {
+                totalCommitContributions
             }
-            url = f"https://github.com/{username}"
-            response = await client.get(url, headers=scrape_headers)
-            
-            if response.status_code == 200:
-                text = response.text
-                # Find the include-fragment src for contributions
-                match = re.search(r'<include-fragment\s+src="([^"]+)"', text)
-                if not match:
-                    match = re.search(r'src="([^"]+tab=contributions[^"]+)"', text)
-                
-                if match:
-                    fragment_url = match.group(1).replace("&amp;", "&")
-                    # Ensure we have a valid URL path
-                    if not fragment_url.startswith("http"):
-                        fragment_url = f"https://github.com{fragment_url}"
-                    
-                    # Fetch fragment with AJAX header
-                    fragment_headers = scrape_headers.copy()
-                    fragment_headers["X-Requested-With"] = "XMLHttpRequest"
-                    
-                    resp2 = await client.get(fragment_url, headers=fragment_headers)
-                    if resp2.status_code == 200:
-                        text2 = resp2.text
-                        count_match = re.search(r'(\d+(?:,\d+)*)\s+contributions\s+in\s+the\s+last\s+year', text2)
-                        if count_match:
-                            return int(count_match.group(1).replace(',', ''))
-        except Exception as e:
-            print(f"GitHub Scraping Error: {e}")
+        }
+    }
+    """
+    await get_limiter("github_graphql").acquire()
+    response = await client.post(
+        "https://api.github.com/graphql",
+        json={"query": query, "variables": {"login": username}},
+        headers=_api_headers()
+    )
+    raise_for_provider_status(response)
+    if response.status_code == 200:
+        data = response.json()
+        if "data" in data and data["data"]["user"]:
+            return data["data"]["user"]["contributionsCollection"]["totalCommitContributions"]
+    return None
+
+async def _commits_via_scrape(username: str, client: httpx.AsyncClient) -> Optional[int]:
+    # Method 2: Scraping (Fallback, works without token)
+    # Both requests are conditional, so unchanged pages cost a 304 and no parsing
+    url = f"https://github.com/{username}"
+    await get_limiter("github_scrape").acquire()
+    fragment_url = await validator_cache.get(client, url, SCRAPE_HEADERS, _parse_fragment_url)
+    if not fragment_url:
+        return None
+
+    # Fetch fragment with AJAX header
+    fragment_headers = SCRAPE_HEADERS.copy()
+    fragment_headers["X-Requested-With"] = "XMLHttpRequest"
+
+    await get_limiter("github_scrape").acquire()
+    return await validator_cache.get(client, fragment_url, fragment_headers, _parse_contribution_count)
+
+async def _commits_via_events(username: str, client: httpx.AsyncClient) -> Optional[int]:
+    # Method 3: Events API (Last resort, only recent events)
+    url = f"https://api.github.com/users/{username}/events/public"
+    await get_limiter("github_events").acquire()
+    return await validator_cache.get(client, url, _api_headers(), _parse_push_commits)
+
+GITHUB_METHODS = {
+    "graphql": _commits_via_graphql,
+    "scrape": _commits_via_scrape,
+    "events": _commits_via_events,
+}
+
+def _remember_method(username: str, method: str):
+    _method_memo[username] = method
+    _method_memo.move_to_end(username)
+    while len(_method_memo) > GITHUB_METHOD_MEMO_SIZE:
+        _method_memo.popitem(last=False)
+
+async def get_github_commits(
+    username: str,
+    client: Optional[httpx.AsyncClient] = None,
+    use_graphql: bool = True
+) -> Optional[int]:
+    if not username:
+        return 0
+
+    client = client or get_http_client()
 
-        # Method 3: Events API (Last resort, only recent events)
+    methods = ["graphql", "scrape", "events"]
+    if not (GITHUB_TOKEN and use_graphql):
+        methods.remove("graphql")
+    # Start with whatever worked for this user last time
+    preferred = _method_memo.get(username)
+    if preferred in methods:
+        methods.remove(preferred)
+        methods.insert(0, preferred)
+
+    for method in methods:
+        breaker = get_breaker(f"github_{method}")
+        if not breaker.allow():
+            continue
         try:
-            url = f"https://api.github.com/users/{username}/events/public"
-            response = await client.get(url, headers=headers)
-            if response.status_code == 200:
-                events = response.json()
-                commit_count = 0
-                for event in events:
-                    if event["type"] == "PushEvent":
-                        commit_count += event["payload"].get("size", 0)
-                return commit_count
-        except Exception:
-            pass
+            commits = await GITHUB_METHODS[method](username, client)
+        except Exception as e:
+            breaker.record_failure()
+            logger.warning(f"GitHub {method} error for {username}: {e}")
+            continue
+        breaker.record_success()
+        if commits is not None:
+            _remember_method(username, method)
+            return commits
+
+    return None
+
+def _parse_fragment_url(response: httpx.Response) -> Optional[str]:
+    text = response.text
+    # Find the include-fragment src for contributions
+    match = re.search(r'<include-fragment\s+src="([^"]+)"', text)
+    if not match:
+        match = re.search(r'src="([^"]+tab=contributions[^"]+)"', text)
+    if not match:
+        return None
+
+    fragment_url = match.group(1).replace("&amp;", "&")
+    # Ensure we have a valid URL path
+    if not fragment_url.startswith("http"):
+        fragment_url = f"https://github.com{fragment_url}"
+    return fragment_url
 
+def _parse_contribution_count(response: httpx.Response) -> Optional[int]:
+    count_match = re.search(r'(\d+(?:,\d+)*)\s+contributions\s+in\s+the\s+last\s+year', response.text)
+    if count_match:
+        return int(count_match.group(1).replace(',', ''))
     return None
+
+def _parse_push_commits(response: httpx.Response) -> int:
+    commit_count = 0
+    for event in response.json():
+        if event["type"] == "PushEvent":
+            commit_count += event["payload"].get("size", 0)
+    return commit_count
+
+def _budget_exhausted() -> bool:
+    remaining = graphql_budget["remaining"]
+    reset_at = graphql_budget["reset_at"]
+    if remaining is None or remaining >= GITHUB_GRAPHQL_MIN_REMAINING:
+        return False
+    # The budget refills once resetAt has passed
+    return reset_at is None or reset_at > datetime.now(timezone.utc)
+
+def _build_batch_query(count: int) -> str:
+    params = ", ".join(f"$u{i}: String!" for i in range(count))
+    fields = "\n".join(
+        f"u{i}: user(login: $u{i}) {{ contributionsCollection {{ totalCommitContributions }} }}"
+        for i in range(count)
+    )
+    return f"query({params}) {{\n rateLimit {{ cost remaining resetAt }}\n{fields}\n}}"
+
+async def _fetch_commits_batch(usernames: List[str], client: httpx.AsyncClient) -> Optional[Dict[str, int]]:
+    """One aliased query; None if it failed and is worth retrying in smaller batches (see run_batches)."""
+    if _budget_exhausted():
+        logger.warning(f"GitHub GraphQL budget low ({graphql_budget['remaining']} left), skipping batch")
+        return {}
+
+    breaker = get_breaker("github_graphql")
+    if not breaker.allow():
+        return {}
+
+    headers = {"Authorization": f"token {GITHUB_TOKEN}"}
+    variables = {f"u{i}": username for i, username in enumerate(usernames)}
+
+    # A failed batch may just be too large, so failures only count against the
+    # breaker once the batch can't be split any further (or when throttled)
+    await get_limiter("github_graphql").acquire()
+    try:
+        response = await client.post(
+            "https://api.github.com/graphql",
+            json={"query": _build_batch_query(len(usernames)), "variables": variables},
+            headers=headers
+        )
+    except Exception:
+        if len(usernames) == 1:
+            breaker.record_failure()
+            raise
+        breaker.release()
+        return None
+
+    try:
+        raise_for_provider_status(response)
+        breaker.record_success()
+    except ProviderError:
+        if len(usernames) == 1 or response.status_code in (403, 429):
+            breaker.record_failure()
+            logger.warning(f"GitHub GraphQL batch failed with status {response.status_code}")
+            return {}
+        breaker.release()
+        return None
+
+    if response.status_code != 200:
+        logger.warning(f"GitHub GraphQL batch failed with status {response.status_code}")
+        return {}
+
+    payload = response.json()
+    data = payload.get("data") or {}
+
+    rate_limit = data.get("rateLimit")
+    if rate_limit:
+        graphql_budget["cost"] = rate_limit.get("cost")
+        graphql_budget["remaining"] = rate_limit.get("remaining")
+        if rate_limit.get("resetAt"):
+            graphql_budget["reset_at"] = datetime.fromisoformat(rate_limit["resetAt"].replace("Z", "+00:00"))
+
+    # A query over the node or complexity limits is rejected as a whole: no data, no alias paths
+    if not data and payload.get("errors") and len(usernames) > 1:
+        return None
+
+    # Errors are reported per alias, e.g. {"type": "NOT_FOUND", "path": ["u3"]}
+    for error in payload.get("errors") or []:
+        path = error.get("path") or []
+        alias = path[0] if path else None
+        username = variables.get(alias, "?")
+        logger.info(f"GitHub GraphQL error for {username}: {error.get('type') or error.get('message')}")
+
+    results = {}
+    for alias, username in variables.items():
+        user = data.get(alias)
+        if user and user.get("contributionsCollection"):
+            results[username] = user["contributionsCollection"]["totalCommitContributions"]
+            _remember_method(username, "graphql")
+    return results
+
+async def get_github_commits_batch(
+    usernames: List[str],
+    client: Optional[httpx.AsyncClient] = None
+) -> Dict[str, int]:
+    """
+    Fetches commit counts for many users with aliased GraphQL queries.
+    Only users that resolved are in the result; missing users, per-alias errors
+    and batches skipped because of a low rate limit budget are left out, so the
+    caller can fall back to the per-user scrape / events path for them.
+    """
+    if not GITHUB_TOKEN or not usernames:
+        return {}
+
+    client = client or get_http_client()
+    return await run_batches(
+        "GitHub GraphQL",
+        usernames,
+        GITHUB_GRAPHQL_BATCH_SIZE,
+        GITHUB_GRAPHQL_BATCH_CONCURRENCY,
+        lambda batch: _fetch_commits_batch(batch, client)
+    )
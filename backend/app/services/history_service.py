@@ -0,0 +1,100 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from ..models import Student, StatsHistory
+from .ranking_service import METRICS
+from .timeutil import utcnow
+
+logger = logging.getLogger(__name__)
+
+# History rows are kept as written for this many days, then thinned to one per day
+HISTORY_RAW_DAYS = int(os.getenv("HISTORY_RAW_DAYS", "30"))
+
+# Student column -> history metric
+METRIC_COLUMNS = {column.key: metric for metric, column in METRICS.items()}
+
+def history_rows(student_id: int, values: Dict[str, Any], recorded_at: datetime) -> List[Dict[str, Any]]:
+    """History rows for the count columns among a student's changed values."""
+    return [
+        {"student_id": student_id, "metric": metric, "value": values[column], "recorded_at": recorded_at}
+        for column, metric in METRIC_COLUMNS.items()
+        if column in values
+    ]
+
+def ensure_history(db: Session):
+    """Seeds the history with everyone's current counts on first start, so later changes have a baseline."""
+    if db.query(StatsHistory.id).first() is not None:
+        return
+    now = utcnow()
+    mappings = []
+    for student_id, commits, points in db.query(Student.id, Student.github_commits_count, Student.leetcode_points):
+        values = {"github_commits_count": commits or 0, "leetcode_points": points or 0}
+        mappings.extend(history_rows(student_id, values, now))
+    db.bulk_insert_mappings(StatsHistory, mappings)
+    db.commit()
+    logger.info("Stats history seeded")
+
+def compact_history(db: Session) -> int:
+    """
+    Downsamples history older than HISTORY_RAW_DAYS to the last row of each
+    student, metric and day. Ids grow with time, so the last row is max(id).
+    Commits and returns the number of rows removed.
+    """
+    cutoff = utcnow() - timedelta(days=HISTORY_RAW_DAYS)
+    keep = (
+        select(func.max(StatsHistory.id))
+        .where(StatsHistory.recorded_at < cutoff)
+        .group_by(StatsHistory.student_id, StatsHistory.metric, func.date(StatsHistory.recorded_at))
+    )
+    removed = db.query(StatsHistory).filter(
+        StatsHistory.recorded_at < cutoff,
+        StatsHistory.id.not_in(keep)
+    ).delete(synchronize_session=False)
+    db.commit()
+    return removed
+
+def student_trend(db: Session, student_id: int, metric: str, since: datetime) -> List[StatsHistory]:
+    """
+    The student's history rows since `since`, preceded by the last row before
+    it (the value at the start of the window).
+    """
+    scope = db.query(StatsHistory).filter(
+        StatsHistory.student_id == student_id,
+        StatsHistory.metric == metric
+    )
+    baseline = scope.filter(StatsHistory.recorded_at < since).order_by(StatsHistory.recorded_at.desc()).first()
+    points = scope.filter(StatsHistory.recorded_at >= since).order_by(StatsHistory.recorded_at).all()
+    return ([baseline] if baseline else []) + points
+
+def window_baselines(db: Session, metric: str, since: datetime, section: Optional[str] = None) -> Dict[int, int]:
+    """
+    Each student whose value changed since `since`, mapped to their value at the
+    start of the window: the last row before it, or for students without
+    older history their first row in the window.
+    """
+    first_in_window = db.query(StatsHistory.student_id, func.min(StatsHistory.id)).filter(
+        StatsHistory.metric == metric,
+        StatsHistory.recorded_at >= since
+    )
+    if section:
+        first_in_window = first_in_window.join(Student, Student.id == StatsHistory.student_id).filter(
+            Student.section == section
+        )
+    baseline_ids = dict(first_in_window.group_by(StatsHistory.student_id).all())
+    if not baseline_ids:
+        return {}
+
+    before_window = db.query(StatsHistory.student_id, func.max(StatsHistory.id)).filter(
+        StatsHistory.metric == metric,
+        StatsHistory.recorded_at < since,
+        StatsHistory.student_id.in_(list(baseline_ids))
+    ).group_by(StatsHistory.student_id)
+    baseline_ids.update(dict(before_window.all()))
+
+    rows = db.query(StatsHistory.student_id, StatsHistory.value).filter(
+        StatsHistory.id.in_(list(baseline_ids.values()))
+    )
+    return dict(rows.all())
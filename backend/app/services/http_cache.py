@@ -0,0 +1,101 @@
+import httpx
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, Optional
+from .circuit_breaker import raise_for_provider_status
+
+logger = logging.getLogger(__name__)
+
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", "./http_cache.json")
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "20000"))
+
+class ValidatorCache:
+    """
+    Persistent ETag / Last-Modified cache keyed by URL.
+    Stores the parsed result of a response next to its validators, so a
+    304 Not Modified reuses the result without downloading or parsing again.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries: Optional[Dict[str, dict]] = None
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+
+    def _load(self):
+        self.entries = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except Exception as e:
+            logger.warning(f"Could not load HTTP cache from {self.path}: {e}")
+
+    def save(self):
+        """Writes the cache to disk if anything changed since the last save."""
+        if not self._dirty or self.entries is None:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except Exception as e:
+            logger.warning(f"Could not save HTTP cache to {self.path}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    async def get(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        headers: Dict[str, str],
+        parse: Callable[[httpx.Response], Any]
+    ) -> Any:
+        """
+        Conditional GET. Returns parse(response) for a 200, the stored value for
+        a 304, and None for any other status. Raises ProviderError when the
+        provider is throttling or failing.
+        """
+        if self.entries is None:
+            self._load()
+
+        entry = self.entries.get(url)
+        request_headers = dict(headers)
+        if entry:
+            if entry.get("etag"):
+                request_headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                request_headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = await client.get(url, headers=request_headers)
+        raise_for_provider_status(response)
+
+        if response.status_code == 304 and entry:
+            self.hits += 1
+            return entry["value"]
+
+        self.misses += 1
+        if response.status_code != 200:
+            return None
+
+        value = parse(response)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            # Re-insert so the dict stays in least-recently-updated order
+            self.entries.pop(url, None)
+            self.entries[url] = {"etag": etag, "last_modified": last_modified, "value": value}
+            while len(self.entries) > self.max_entries:
+                self.entries.pop(next(iter(self.entries)))
+            self._dirty = True
+        return value
+
+
+validator_cache = ValidatorCache(HTTP_CACHE_PATH, HTTP_CACHE_MAX_ENTRIES)
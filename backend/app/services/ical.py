@@ -0,0 +1,87 @@
+from datetime import date, datetime, timezone
+from typing import AsyncIterator, Dict, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+# An iCalendar property: (parameters, value), e.g. DTSTART;VALUE=DATE:20251212
+Property = Tuple[Dict[str, str], str]
+
+def parse_line(line: str) -> Tuple[str, Property]:
+    """'DTSTART;TZID=Asia/Kolkata:20251212T235900' -> ('DTSTART', ({'TZID': 'Asia/Kolkata'}, '20251212T235900'))"""
+    head, _, value = line.partition(":")
+    name, *params = head.split(";")
+    parameters = {}
+    for param in params:
+        key, _, param_value = param.partition("=")
+        parameters[key.upper()] = param_value.strip('"')
+    return name.upper(), (parameters, value)
+
+def unescape(value: str) -> str:
+    out = []
+    chars = iter(value)
+    for char in chars:
+        if char == "\\":
+            char = next(chars, "")
+            out.append("\n" if char in ("n", "N") else char)
+        else:
+            out.append(char)
+    return "".join(out)
+
+def parse_datetime(prop: Property) -> Optional[datetime]:
+    """DATE or DATE-TIME value as an aware datetime. Floating times are taken as UTC."""
+    parameters, value = prop
+    try:
+        if parameters.get("VALUE") == "DATE" or len(value) == 8:
+            day = date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+            return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+        parsed = datetime.strptime(value.rstrip("Z"), "%Y%m%dT%H%M%S")
+    except ValueError:
+        return None
+    if "TZID" in parameters and not value.endswith("Z"):
+        try:
+            return parsed.replace(tzinfo=ZoneInfo(parameters["TZID"]))
+        except Exception:
+            pass
+    return parsed.replace(tzinfo=timezone.utc)
+
+class EventParser:
+    """
+    Incremental VEVENT parser: feed it unfolded lines as they arrive and it
+    returns each event's properties once its END:VEVENT is seen.
+    """
+
+    def __init__(self):
+        self.calendar_seen = False
+        self._event: Optional[Dict[str, Property]] = None
+
+    def feed(self, line: str) -> Optional[Dict[str, Property]]:
+        name, prop = parse_line(line)
+        if name == "BEGIN":
+            if prop[1] == "VCALENDAR":
+                self.calendar_seen = True
+            elif prop[1] == "VEVENT":
+                self._event = {}
+        elif name == "END" and prop[1] == "VEVENT":
+            event, self._event = self._event, None
+            return event
+        elif self._event is not None:
+            # Keep the first occurrence; repeated properties (e.g. ATTENDEE) aren't used here
+            self._event.setdefault(name, prop)
+        return None
+
+async def unfold(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Joins folded lines (continuations start with a space or tab, RFC 5545 3.1)
+    of a stream such as httpx's Response.aiter_lines().
+    """
+    current = None
+    async for line in lines:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t"):
+            if current is not None:
+                current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current:
+        yield current
@@ -0,0 +1,315 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import asdict
+from datetime import timedelta
+from typing import List, Optional
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import AsyncSessionLocal
+from ..models import (
+    RefreshJob, Student,
+    JOB_SWEEP, JOB_STUDENT, JOB_SHARD, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED,
+    STATS_FAILED, STATS_PENDING,
+)
+from .http_cache import validator_cache
+from .leases import LEASE_OWNER
+from .refresh_service import run_sweep
+from .stats_service import refresh_stats, save_stats
+from .timeutil import utcnow
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "5"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Retry n waits JOB_RETRY_BASE * 2^(n-1) seconds
+JOB_RETRY_BASE = float(os.getenv("JOB_RETRY_BASE", "30"))
+# A running job's lease is renewed every JOB_LEASE_SECONDS / 3; once it has
+# expired the worker is assumed dead and the job is requeued
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+# Minimum seconds between progress writes of a running sweep
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "2"))
+
+ACTIVE_STATUSES = (JOB_QUEUED, JOB_RUNNING)
+
+def _dedup_key(kind: str, student_id: Optional[int], student_ids: Optional[List[int]]) -> str:
+    if kind == JOB_SWEEP:
+        return JOB_SWEEP
+    if kind == JOB_SHARD:
+        # The full id list decides identity; the range is only there to read in logs
+        digest = hashlib.sha1(",".join(map(str, sorted(student_ids))).encode()).hexdigest()[:16]
+        return f"{JOB_SHARD}:{min(student_ids)}-{max(student_ids)}:{digest}"
+    return f"{JOB_STUDENT}:{student_id}"
+
+async def _active_job(db: AsyncSession, dedup_key: str) -> Optional[RefreshJob]:
+    return (await db.execute(
+        select(RefreshJob).where(
+            RefreshJob.dedup_key == dedup_key,
+            RefreshJob.status.in_(ACTIVE_STATUSES)
+        )
+    )).scalar_one_or_none()
+
+async def enqueue_job(
+    db: AsyncSession,
+    kind: str,
+    student_id: Optional[int] = None,
+    student_ids: Optional[List[int]] = None
+) -> RefreshJob:
+    """
+    Queues a refresh job, or returns the queued / running job for the same work,
+    so repeated triggers share one execution. Commits.
+    """
+    dedup_key = _dedup_key(kind, student_id, student_ids)
+    existing = await _active_job(db, dedup_key)
+    if existing:
+        return existing
+
+    now = utcnow()
+    job = RefreshJob(
+        kind=kind,
+        student_id=student_id,
+        student_ids=json.dumps(student_ids) if student_ids is not None else None,
+        dedup_key=dedup_key,
+        status=JOB_QUEUED,
+        attempts=0,
+        max_attempts=JOB_MAX_ATTEMPTS,
+        run_after=now,
+        progress_done=0,
+        progress_total=0,
+        created_at=now,
+    )
+    db.add(job)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Another trigger queued the same work in the meantime
+        await db.rollback()
+        existing = await _active_job(db, dedup_key)
+        if existing:
+            return existing
+        raise
+
+    worker_pool.notify()
+    return job
+
+def _lease_expiry():
+    return utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)
+
+async def _requeue_stale_jobs(db: AsyncSession):
+    result = await db.execute(
+        update(RefreshJob)
+        .where(RefreshJob.status == JOB_RUNNING, RefreshJob.lease_expires_at < utcnow())
+        .values(status=JOB_QUEUED, run_after=utcnow(), locked_by=None, lease_expires_at=None)
+    )
+    if result.rowcount:
+        logger.warning(f"Requeued {result.rowcount} stale refresh jobs")
+    await db.commit()
+
+async def claim_next_job() -> Optional[RefreshJob]:
+    """
+    Claims the oldest due job and takes its lease. The conditional UPDATE makes
+    the claim safe when several workers (or processes) race for the same row.
+    """
+    async with AsyncSessionLocal() as db:
+        await _requeue_stale_jobs(db)
+        while True:
+            job = (await db.execute(
+                select(RefreshJob)
+                .where(RefreshJob.status == JOB_QUEUED, RefreshJob.run_after <= utcnow())
+                .order_by(RefreshJob.run_after, RefreshJob.id)
+                .limit(1)
+            )).scalar_one_or_none()
+            if job is None:
+                await db.commit()
+                return None
+
+            result = await db.execute(
+                update(RefreshJob)
+                .where(RefreshJob.id == job.id, RefreshJob.status == JOB_QUEUED)
+                .values(
+                    status=JOB_RUNNING,
+                    attempts=RefreshJob.attempts + 1,
+                    started_at=utcnow(),
+                    locked_by=LEASE_OWNER,
+                    lease_expires_at=_lease_expiry()
+                )
+            )
+            await db.commit()
+            if result.rowcount == 1:
+                await db.refresh(job)
+                return job
+
+async def _update_job(job_id: int, **values):
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(RefreshJob).where(RefreshJob.id == job_id).values(**values))
+        await db.commit()
+
+async def _renew_lease(job_id: int):
+    """Heartbeat that keeps the lease of a running job alive."""
+    while True:
+        await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+        try:
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    update(RefreshJob)
+                    .where(
+                        RefreshJob.id == job_id,
+                        RefreshJob.status == JOB_RUNNING,
+                        RefreshJob.locked_by == LEASE_OWNER
+                    )
+                    .values(lease_expires_at=_lease_expiry())
+                )
+                await db.commit()
+            if result.rowcount == 0:
+                logger.warning(f"Lost the lease on refresh job {job_id}")
+                return
+        except Exception as e:
+            logger.error(f"Error renewing lease on refresh job {job_id}: {e}")
+
+def _progress_writer(job: RefreshJob):
+    last_write = 0.0
+    written = -1
+    # Progress is reported from concurrent tasks; one write at a time, and
+    # never an older count after a newer one
+    lock = asyncio.Lock()
+
+    async def on_progress(done: int, total: int):
+        nonlocal last_write, written
+        if done < total and time.monotonic() - last_write < JOB_PROGRESS_INTERVAL:
+            return
+        last_write = time.monotonic()
+        async with lock:
+            if done <= written:
+                return
+            await _update_job(job.id, progress_done=done, progress_total=total)
+            written = done
+
+    return on_progress
+
+async def _run_sweep_job(job: RefreshJob) -> dict:
+    async with AsyncSessionLocal() as db:
+        summary = await run_sweep(db, on_progress=_progress_writer(job))
+
+    cache_stats = validator_cache.stats()
+    logger.info(f"Stats sweep finished: {summary}")
+    logger.info(f"HTTP validator cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    return asdict(summary)
+
+async def _run_shard_job(job: RefreshJob) -> dict:
+    student_ids = json.loads(job.student_ids)
+    async with AsyncSessionLocal() as db:
+        students = (await db.execute(
+            select(Student).where(Student.id.in_(student_ids))
+        )).scalars().all()
+        summary = await run_sweep(db, students=students, on_progress=_progress_writer(job))
+
+    logger.info(f"Refresh shard {job.dedup_key} finished: {summary}")
+    return asdict(summary)
+
+async def _run_student_job(job: RefreshJob) -> dict:
+    async with AsyncSessionLocal() as db:
+        student = await db.get(Student, job.student_id)
+        if student is None:
+            return {"skipped": "student not found"}
+        await db.commit()
+
+        ok = await refresh_stats(db, student)
+        if not ok:
+            if job.attempts >= job.max_attempts and student.stats_status == STATS_PENDING:
+                # Registration fetch gave up; the next refresh will retry
+                await save_stats(db, student, None, None, STATS_FAILED)
+            raise RuntimeError("Provider lookup failed")
+        return {
+            "github_commits_count": student.github_commits_count,
+            "leetcode_points": student.leetcode_points,
+        }
+
+async def run_job(job: RefreshJob):
+    heartbeat = asyncio.create_task(_renew_lease(job.id))
+    try:
+        await _execute_job(job)
+    finally:
+        heartbeat.cancel()
+
+async def _execute_job(job: RefreshJob):
+    try:
+        if job.kind == JOB_SWEEP:
+            result = await _run_sweep_job(job)
+        elif job.kind == JOB_SHARD:
+            result = await _run_shard_job(job)
+        else:
+            result = await _run_student_job(job)
+    except Exception as e:
+        if job.attempts >= job.max_attempts:
+            logger.error(f"Refresh job {job.id} failed after {job.attempts} attempts: {e}")
+            await _update_job(
+                job.id, status=JOB_FAILED, error=str(e), finished_at=utcnow(),
+                locked_by=None, lease_expires_at=None
+            )
+        else:
+            delay = JOB_RETRY_BASE * 2 ** (job.attempts - 1)
+            logger.warning(f"Refresh job {job.id} failed ({e}), retrying in {delay:.0f}s")
+            await _update_job(
+                job.id,
+                status=JOB_QUEUED,
+                error=str(e),
+                run_after=utcnow() + timedelta(seconds=delay),
+                locked_by=None,
+                lease_expires_at=None
+            )
+        return
+
+    await _update_job(
+        job.id, status=JOB_SUCCEEDED, result=json.dumps(result), error=None, finished_at=utcnow(),
+        progress_done=RefreshJob.progress_total, locked_by=None, lease_expires_at=None
+    )
+
+class JobWorkerPool:
+    """Fixed number of asyncio workers that claim and run queued refresh jobs."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work(i)) for i in range(self.size)]
+        logger.info(f"Started {self.size} refresh job workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wakes idle workers after a job was queued in this process."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _work(self, worker_id: int):
+        while True:
+            try:
+                self._wakeup.clear()
+                job = await claim_next_job()
+                if job is not None:
+                    await run_job(job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Refresh job worker {worker_id} error: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+
+worker_pool = JobWorkerPool(JOB_WORKERS)
@@ -0,0 +1,43 @@
+import os
+import socket
+import uuid
+from datetime import timedelta
+from sqlalchemy import delete, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import Lease
+from .timeutil import utcnow
+
+# Identifies this process among the uvicorn / gunicorn workers sharing the database
+LEASE_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+async def acquire_lease(db: AsyncSession, name: str, ttl: float) -> bool:
+    """
+    Takes or renews the named lease for ttl seconds. Returns False while another
+    process holds an unexpired lease. Commits.
+    """
+    now = utcnow()
+    expires_at = now + timedelta(seconds=ttl)
+    # Conditional UPDATE, so only one of several racing processes can win an expired lease
+    result = await db.execute(
+        update(Lease)
+        .where(Lease.name == name, or_(Lease.owner == LEASE_OWNER, Lease.expires_at < now))
+        .values(owner=LEASE_OWNER, expires_at=expires_at)
+    )
+    if result.rowcount == 1:
+        await db.commit()
+        return True
+
+    db.add(Lease(name=name, owner=LEASE_OWNER, expires_at=expires_at))
+    try:
+        await db.commit()
+        return True
+    except IntegrityError:
+        # Held by someone else
+        await db.rollback()
+        return False
+
+async def release_lease(db: AsyncSession, name: str):
+    """Gives the lease up early (on shutdown) so another process can take over at once. Commits."""
+    await db.execute(delete(Lease).where(Lease.name == name, Lease.owner == LEASE_OWNER))
+    await db.commit()
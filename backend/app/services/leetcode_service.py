@@ -1,47 +1,145 @@
 import httpx
-from typing import Optional
+import logging
+import os
+from typing import Dict, List, Optional
+from .batching import run_batches
+from .circuit_breaker import ProviderError, get_breaker, raise_for_provider_status
+from .http_client import get_http_client
+from .rate_limiter import get_limiter
 
-async def get_leetcode_stats(username: str) -> Optional[int]:
+logger = logging.getLogger(__name__)
+
+LEETCODE_GRAPHQL_URL = "https://leetcode.com/graphql"
+
+# Users per aliased query, and how many batch queries run at once
+LEETCODE_BATCH_SIZE = int(os.getenv("LEETCODE_BATCH_SIZE", "25"))
+LEETCODE_BATCH_CONCURRENCY = int(os.getenv("LEETCODE_BATCH_CONCURRENCY", "2"))
+
+def _solved_count(matched_user: Optional[dict]) -> int:
+    if not matched_user:
+        return 0
+    ac_submissions = matched_user["submitStats"]["acSubmissionNum"]
+    # The first item usually is 'All'
+    for item in ac_submissions:
+        if item["difficulty"] == "All":
+            return item["count"]
+    return 0
+
+async def get_leetcode_stats(username: str, client: Optional[httpx.AsyncClient] = None) -> Optional[int]:
     if not username:
         return 0
-        
+
+    # Fail fast while LeetCode is down instead of waiting out a timeout per student
+    breaker = get_breaker("leetcode")
+    if not breaker.allow():
+        return None
+
     try:
-        url = "https://leetcode.com/graphql"
         query = """
         query userProblemsSolved($username: String!) {
-            allQuestionsCount {
-                difficulty
-                count
-            }
             matchedUser(username: $username) {
                 submitStats {
                     acSubmissionNum {
                         difficulty
                         count
-                        submissions
                     }
                 }
             }
         }
         """
         variables = {"username": username}
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json={"query": query, "variables": variables})
-            
-            if response.status_code == 200:
-                data = response.json()
-                if "data" in data and "matchedUser" in data["data"] and data["data"]["matchedUser"]:
-                    # Get total solved count
-                    ac_submissions = data["data"]["matchedUser"]["submitStats"]["acSubmissionNum"]
-                    # The first item usually is 'All'
-                    for item in ac_submissions:
-                        if item["difficulty"] == "All":
-                            return item["count"]
-                return 0
-            else:
-                print(f"LeetCode API Error: {response.status_code}")
-                return None
+
+        client = client or get_http_client()
+        await get_limiter("leetcode").acquire()
+        response = await client.post(LEETCODE_GRAPHQL_URL, json={"query": query, "variables": variables})
+        raise_for_provider_status(response)
+        breaker.record_success()
+
+        if response.status_code == 200:
+            data = response.json()
+            if "data" in data and "matchedUser" in data["data"]:
+                return _solved_count(data["data"]["matchedUser"])
+            return 0
+        else:
+            logger.warning(f"LeetCode API Error: {response.status_code}")
+            return None
     except Exception as e:
-        print(f"Error fetching LeetCode stats: {e}")
+        breaker.record_failure()
+        logger.error(f"Error fetching LeetCode stats: {e}")
+        return None
+
+def _build_batch_query(count: int) -> str:
+    params = ", ".join(f"$u{i}: String!" for i in range(count))
+    fields = "\n".join(
+        f"u{i}: matchedUser(username: $u{i}) {{ submitStats {{ acSubmissionNum {{ difficulty count }} }} }}"
+        for i in range(count)
+    )
+    return f"query({params}) {{\n{fields}\n}}"
+
+async def _fetch_stats_batch(usernames: List[str], client: httpx.AsyncClient) -> Optional[Dict[str, int]]:
+    """One aliased query; None if it failed and is worth retrying in smaller batches (see run_batches)."""
+    breaker = get_breaker("leetcode")
+    if not breaker.allow():
+        return {}
+
+    variables = {f"u{i}": username for i, username in enumerate(usernames)}
+
+    # A failed batch may just be too large, so failures only count against the
+    # breaker once the batch can't be split any further (or when throttled)
+    await get_limiter("leetcode").acquire()
+    try:
+        response = await client.post(
+            LEETCODE_GRAPHQL_URL,
+            json={"query": _build_batch_query(len(usernames)), "variables": variables}
+        )
+    except Exception:
+        if len(usernames) == 1:
+            breaker.record_failure()
+            raise
+        breaker.release()
+        return None
+
+    try:
+        raise_for_provider_status(response)
+        breaker.record_success()
+    except ProviderError:
+        if len(usernames) == 1 or response.status_code in (403, 429):
+            breaker.record_failure()
+            logger.warning(f"LeetCode batch failed with status {response.status_code}")
+            return {}
+        breaker.release()
         return None
+
+    data = None
+    if response.status_code == 200:
+        data = response.json().get("data")
+
+    if data is None:
+        # LeetCode rejects large or expensive queries outright
+        if len(usernames) == 1:
+            logger.warning(f"LeetCode lookup failed for {usernames[0]} (status {response.status_code})")
+            return {}
+        return None
+
+    return {username: _solved_count(data.get(alias)) for alias, username in variables.items()}
+
+async def get_leetcode_stats_batch(
+    usernames: List[str],
+    client: Optional[httpx.AsyncClient] = None
+) -> Dict[str, int]:
+    """
+    Fetches solved counts for many users with aliased matchedUser queries.
+    Unknown users count as 0, like get_leetcode_stats. Users whose lookup failed
+    are left out of the result so the caller can fall back to the per-user path.
+    """
+    if not usernames:
+        return {}
+
+    client = client or get_http_client()
+    return await run_batches(
+        "LeetCode",
+        usernames,
+        LEETCODE_BATCH_SIZE,
+        LEETCODE_BATCH_CONCURRENCY,
+        lambda batch: _fetch_stats_batch(batch, client)
+    )
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from zoneinfo import ZoneInfo
+import httpx
+from ..models import MoodleCalendarFeed
+from .ical import Property, EventParser, parse_datetime, unescape, unfold
+from .moodle_service import MOODLE_TIMEOUT, MoodleClient, MoodleUnavailableError, TeacherIndex, get_transport, teacher_index
+from .timeutil import utcnow
+
+logger = logging.getLogger(__name__)
+
+# Due dates are shown in the students' (Moodle's) time zone
+MOODLE_TIMEZONE = ZoneInfo(os.getenv("MOODLE_TIMEZONE", "Asia/Kolkata"))
+
+# Properties that identify a version of an event; DTSTAMP is left out since
+# Moodle sets it to the export time
+VERSION_PROPERTIES = ("LAST-MODIFIED", "SEQUENCE", "SUMMARY", "CATEGORIES", "DTSTART", "DTEND")
+
+class InvalidFeedError(Exception):
+    """The export URL no longer returns a calendar (token revoked, password changed)."""
+
+def _fingerprint(event: Dict[str, Property]) -> str:
+    raw = "\x1f".join(event[name][1] if name in event else "" for name in VERSION_PROPERTIES)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def _process(event: Dict[str, Property], fingerprint: str, teachers: TeacherIndex) -> Dict[str, Any]:
+    """Turns a VEVENT into the stored assignment record, enriched with the teacher."""
+    title = unescape(event["SUMMARY"][1]) if "SUMMARY" in event else "Untitled event"
+    course = unescape(event["CATEGORIES"][1]) if "CATEGORIES" in event else "Moodle Course"
+    due_prop = event.get("DTSTART") or event.get("DTEND")
+    due = parse_datetime(due_prop) if due_prop else None
+
+    clean_course = MoodleClient.clean_course_name(course)
+    teacher = teachers.lookup(clean_course)
+    return {
+        "fingerprint": fingerprint,
+        "title": title,
+        "course": f"{clean_course} ({teacher})" if teacher else clean_course,
+        "due": due.isoformat() if due else None,
+    }
+
+def _categorize(events: Dict[str, Dict[str, Any]], now: datetime) -> Dict[str, List[Dict]]:
+    """Same split as MoodleClient.process_assignments, but from exact due times."""
+    pending = []
+    completed = []
+    for record in sorted(events.values(), key=lambda record: record["due"] or ""):
+        due = datetime.fromisoformat(record["due"]) if record["due"] else None
+        assign = {
+            "title": record["title"],
+            "course": record["course"],
+            "status": "Left",
+            # Same format Moodle's calendar shows, e.g. "Friday, 12 December, 11:59 PM"
+            "date": due.astimezone(MOODLE_TIMEZONE).strftime("%A, %d %B, %I:%M %p") if due else "Upcoming",
+        }
+        title = record["title"].lower()
+        if (due is not None and due < now) or "submitted" in title or "graded" in title:
+            assign["status"] = "Done"
+            completed.append(assign)
+        else:
+            pending.append(assign)
+    return {"pending": pending, "completed": completed}
+
+async def sync_feed(feed: MoodleCalendarFeed) -> Dict[str, List[Dict]]:
+    """
+    Streams the student's iCal export and syncs feed.events by UID: unchanged
+    events keep their stored record and only new or changed ones are processed.
+    Events gone from the export are dropped. Returns the assignments. No
+    session or login is involved; the URL carries its own token.
+    """
+    teachers: Optional[TeacherIndex] = None
+    previous = json.loads(feed.events)
+    events: Dict[str, Dict[str, Any]] = {}
+    processed = 0
+    parser = EventParser()
+
+    # Cookieless client on the shared Moodle connection pool. Not closed, since
+    # closing a client closes its transport.
+    client = httpx.AsyncClient(transport=get_transport(), follow_redirects=True, timeout=MOODLE_TIMEOUT)
+    try:
+        async with client.stream("GET", feed.url) as response:
+            if response.status_code >= 500:
+                raise MoodleUnavailableError(f"Moodle returned {response.status_code}")
+            if response.status_code != 200:
+                raise InvalidFeedError(f"Calendar export returned {response.status_code}")
+            async for line in unfold(response.aiter_lines()):
+                event = parser.feed(line)
+                if event is None or "UID" not in event:
+                    continue
+                uid = event["UID"][1]
+                fingerprint = _fingerprint(event)
+                record = previous.get(uid)
+                if record is None or record["fingerprint"] != fingerprint:
+                    if teachers is None:
+                        teachers = teacher_index(json.loads(feed.course_map))
+                    record = _process(event, fingerprint, teachers)
+                    processed += 1
+                events[uid] = record
+    except httpx.HTTPError as e:
+        raise MoodleUnavailableError(str(e)) from e
+
+    if not parser.calendar_seen:
+        raise InvalidFeedError("Calendar export did not return a calendar")
+
+    removed = len(previous.keys() - events.keys())
+    logger.info(f"Calendar feed synced: {len(events)} events, {processed} new or changed, {removed} removed")
+    now = utcnow()
+    feed.events = json.dumps(events)
+    feed.synced_at = now
+    return _categorize(events, now)
@@ -0,0 +1,124 @@
+import calendar
+import functools
+import os
+import re
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional, Tuple
+from dateutil import parser as dateutil_parser
+
+# Distinct raw date strings whose parsed form is remembered, process-wide
+MOODLE_DATE_CACHE_SIZE = int(os.getenv("MOODLE_DATE_CACHE_SIZE", "4096"))
+
+MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+MONTHS["sept"] = 9
+WEEKDAYS = {name.lower(): number for number, name in enumerate(calendar.day_name)}
+WEEKDAYS.update({name.lower(): number for number, name in enumerate(calendar.day_abbr)})
+RELATIVE_DAYS = {"yesterday": -1, "today": 0, "tomorrow": 1}
+
+# Separators are optional because get_text(strip=True) glues text nodes
+# together, e.g. "Friday, 12 December,11:59 PM"
+ABSOLUTE_DATE = re.compile(
+    r"^(?:(?P<weekday>[a-z]+)\s*,?\s*)?(?P<day>\d{1,2})\s+(?P<month>[a-z]+)\.?"
+    r"(?:\s*,?\s*(?P<year>\d{4}))?(?:\s*,?\s*(?P<time>.+))?$",
+    re.IGNORECASE,
+)
+RELATIVE_DATE = re.compile(r"^(?P<relative>yesterday|today|tomorrow)(?:\s*,?\s*(?P<time>.+))?$", re.IGNORECASE)
+TIME = re.compile(r"^(?P<hour>\d{1,2}):(?P<minute>\d{2})\s*(?P<meridiem>[ap])?\.?(?:m\.?)?$", re.IGNORECASE)
+
+class DateSpec(NamedTuple):
+    """A Moodle date as written, before it is placed relative to the current time."""
+    relative_days: Optional[int]  # Today/Tomorrow/Yesterday
+    day: int
+    month: int
+    year: Optional[int]
+    weekday: Optional[int]
+    hour: int
+    minute: int
+
+def _parse_time(text: Optional[str]) -> Optional[Tuple[int, int]]:
+    # A date without a time is due by the end of that day
+    if not text:
+        return 23, 59
+    match = TIME.match(text.strip())
+    if not match:
+        return None
+    hour, minute = int(match["hour"]), int(match["minute"])
+    meridiem = (match["meridiem"] or "").lower()
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem == "p" else 0)
+    if hour > 23 or minute > 59:
+        return None
+    return hour, minute
+
+@functools.lru_cache(maxsize=MOODLE_DATE_CACHE_SIZE)
+def _parse_spec(text: str) -> Optional[DateSpec]:
+    """The date fields of one of Moodle's formats, or None for anything else."""
+    match = RELATIVE_DATE.match(text)
+    if match:
+        time = _parse_time(match["time"])
+        if time is None:
+            return None
+        return DateSpec(RELATIVE_DAYS[match["relative"].lower()], 0, 0, None, None, *time)
+
+    match = ABSOLUTE_DATE.match(text)
+    if not match:
+        return None
+    month = MONTHS.get(match["month"].lower())
+    weekday = WEEKDAYS.get(match["weekday"].lower()) if match["weekday"] else None
+    time = _parse_time(match["time"])
+    if month is None or time is None or (match["weekday"] and weekday is None):
+        return None
+    return DateSpec(None, int(match["day"]), month, int(match["year"]) if match["year"] else None, weekday, *time)
+
+def _resolve(spec: DateSpec, now: datetime) -> Optional[datetime]:
+    if spec.relative_days is not None:
+        day = now + timedelta(days=spec.relative_days)
+        return datetime(day.year, day.month, day.day, spec.hour, spec.minute)
+    if spec.year is not None:
+        try:
+            return datetime(spec.year, spec.month, spec.day, spec.hour, spec.minute)
+        except ValueError:
+            return None
+
+    # No year: Moodle leaves it out for dates near the current one, so take the
+    # nearest candidate ("Friday, 12 January" read in December is next January),
+    # preferring one that falls on the stated weekday
+    candidates = []
+    for year in (now.year - 1, now.year, now.year + 1):
+        try:
+            candidates.append(datetime(year, spec.month, spec.day, spec.hour, spec.minute))
+        except ValueError:  # 29 February
+            pass
+    if spec.weekday is not None:
+        candidates = [c for c in candidates if c.weekday() == spec.weekday] or candidates
+    return min(candidates, key=lambda c: abs(c - now), default=None)
+
+class MoodleDateParser:
+    """
+    Parses Moodle's due dates ("Friday, 12 December, 11:59 PM", "Tomorrow,
+    11:59 PM", "Today") with compiled patterns, remembering each raw string.
+    Anything else goes to dateutil's fuzzy parser; `misses` counts how often.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def parse(self, text: str, now: datetime) -> datetime:
+        """Naive local datetime of `text`. Raises like dateutil when nothing can parse it."""
+        spec = _parse_spec(text.strip())
+        due = _resolve(spec, now) if spec else None
+        if due is not None:
+            self.hits += 1
+            return due
+        self.misses += 1
+        return dateutil_parser.parse(text, fuzzy=True, dayfirst=True)
+
+    def stats(self) -> dict:
+        memo = _parse_spec.cache_info()
+        return {"hits": self.hits, "misses": self.misses, "memo_hits": memo.hits, "memo_size": memo.currsize}
+
+moodle_dates = MoodleDateParser()
@@ -1,27 +1,177 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import functools
+import html
+import httpx
+from bs4 import BeautifulSoup, SoupStrainer
 import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+from .moodle_dates import moodle_dates
 
 logger = logging.getLogger(__name__)
 
+# Logged-in sessions kept across requests, evicted when idle or least recently used
+MOODLE_SESSION_POOL_SIZE = int(os.getenv("MOODLE_SESSION_POOL_SIZE", "200"))
+MOODLE_SESSION_TTL = float(os.getenv("MOODLE_SESSION_TTL", "1800"))
+MOODLE_TIMEOUT = float(os.getenv("MOODLE_TIMEOUT", "20"))
+MOODLE_MAX_CONNECTIONS = int(os.getenv("MOODLE_MAX_CONNECTIONS", "50"))
+# Distinct raw course names whose cleaned form is remembered, process-wide
+COURSE_NAME_CACHE_SIZE = int(os.getenv("COURSE_NAME_CACHE_SIZE", "4096"))
+# Distinct course maps (usually one per batch of students) whose teacher lookups are remembered
+TEACHER_INDEX_CACHE_SIZE = int(os.getenv("TEACHER_INDEX_CACHE_SIZE", "256"))
+
+YEAR_PREFIX = re.compile(r'^\d{4}-\d{2}[_ ]*')
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+def _class_strainer(names: List[str], classes: List[str]) -> SoupStrainer:
+    """Keeps only `names` tags carrying one of `classes`, with everything inside them."""
+    # Matched against the raw class attribute while parsing, e.g. "card dashboard-card"
+    pattern = re.compile(r"(?:^|\s)(?:" + "|".join(map(re.escape, classes)) + r")(?:\s|$)")
+    return SoupStrainer(names, attrs={"class": pattern})
+
+# Page regions the scrapers search; the rest of a page is never built into a tree.
+# Each covers every selector fallback used on that page.
+CALENDAR_EVENTS = _class_strainer(["div", "li"], ["event", "calendar_event_item", "card", "list-group-item"])
+COURSE_CARDS = _class_strainer(["div"], ["dashboard-card", "course-info-container", "card-body"])
+LOGIN_FORM = SoupStrainer(["input", "title"])
+EXPORT_FORM_FIELDS = SoupStrainer("input")
+EXPORT_URL_PATTERN = re.compile(r"https?://[^\s\"'<>]+/calendar/export_execute\.php\?[^\s\"'<>]+")
+PAGE_TITLE = SoupStrainer("title")
+
+def parse_html(markup, parse_only: Optional[SoupStrainer] = None) -> BeautifulSoup:
+    """Parses with lxml when it is installed, limited to the parse_only region if given."""
+    return BeautifulSoup(markup, HTML_PARSER, parse_only=parse_only)
+
+# Connection pool shared by every student's client; each client only adds its own cookie jar
+_transport: Optional[httpx.AsyncHTTPTransport] = None
+
+def get_transport() -> httpx.AsyncHTTPTransport:
+    global _transport
+    if _transport is None:
+        _transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=MOODLE_MAX_CONNECTIONS, max_keepalive_connections=MOODLE_MAX_CONNECTIONS)
+        )
+    return _transport
+
+async def close_transport():
+    """Closes the shared Moodle connections. Called from the app lifespan."""
+    global _transport
+    if _transport is not None:
+        await _transport.aclose()
+        _transport = None
+
+class TeacherIndex:
+    """
+    Teacher lookup for one course -> teacher map: the first key, in order,
+    that contains the course name or is contained in it. Each name is scanned
+    once and remembered; get one through teacher_index() so the memo is shared
+    by every student with the same course map.
+    """
+
+    def __init__(self, mapping: Dict[str, str]):
+        self.mapping = mapping
+        self._resolved: Dict[str, Optional[str]] = {}
+
+    def _scan(self, course_name: str) -> Optional[str]:
+        # Fuzzy match course name to mapping keys
+        for k, v in self.mapping.items():
+            if course_name in k or k in course_name:
+                return v
+        return None
+
+    def lookup(self, course_name: str) -> Optional[str]:
+        if course_name not in self._resolved:
+            self._resolved[course_name] = self._scan(course_name)
+        return self._resolved[course_name]
+
+@functools.lru_cache(maxsize=TEACHER_INDEX_CACHE_SIZE)
+def _teacher_index(items: Tuple[Tuple[str, str], ...]) -> TeacherIndex:
+    return TeacherIndex(dict(items))
+
+def teacher_index(mapping: Dict[str, str]) -> TeacherIndex:
+    """The shared TeacherIndex of a course map. Keyed on the items in order, since the first match wins."""
+    return _teacher_index(tuple(mapping.items()))
+
+
+class MoodleUnavailableError(Exception):
+    """Moodle could not be reached or answered with a server error."""
+
+
 class MoodleClient:
     LOGIN_URL = "http://lms.kiet.edu/moodle/login/index.php"
     CALENDAR_URL = "http://lms.kiet.edu/moodle/calendar/view.php"
+    DASHBOARD_URL = "http://lms.kiet.edu/moodle/my/"
+    EXPORT_URL = "http://lms.kiet.edu/moodle/calendar/export.php"
     
     def __init__(self, username, password):
         self.username = username
         self.password = password
-        self.session = requests.Session()
+        # Cookie jar of this student's Moodle session on the shared connection pool
+        self.session = httpx.AsyncClient(
+            transport=get_transport(),
+            follow_redirects=True,
+            timeout=MOODLE_TIMEOUT
+        )
         self.is_logged_in = False
+        # Course -> teacher mapping of the last parsed dashboard
+        self.course_map: Dict[str, str] = {}
+        # A pooled client is used by one request at a time
+        self.lock = asyncio.Lock()
+        # Concurrent fetches that both find the session expired log in only once
+        self._login_lock = asyncio.Lock()
+        self._logins = 0
+
+    @staticmethod
+    def _is_login_page(response) -> bool:
+        """Moodle answers requests from an expired session with the login form."""
+        return "/login/" in str(response.url) or 'name="logintoken"' in response.text
+
+    async def _fetch(self, url: str, data: Optional[Dict[str, str]] = None):
+        """GET (or POST with data); connection errors and 5xx answers raise MoodleUnavailableError."""
+        try:
+            if data is None:
+                response = await self.session.get(url)
+            else:
+                response = await self.session.post(url, data=data)
+        except httpx.HTTPError as e:
+            raise MoodleUnavailableError(str(e)) from e
+        if response.status_code >= 500:
+            raise MoodleUnavailableError(f"Moodle returned {response.status_code}")
+        return response
+
+    async def _get(self, url: str):
+        """GET with the stored session cookies, logging in again once if they expired."""
+        logins = self._logins
+        response = await self._fetch(url)
+        if self._is_login_page(response):
+            async with self._login_lock:
+                if self._logins == logins:
+                    logger.info(f"Moodle session expired for {self.username}, logging in again")
+                    self.is_logged_in = False
+                    if not await self.login():
+                        raise ValueError("Login failed")
+            response = await self._fetch(url)
+        return response
 
-    def login(self) -> bool:
-        """Logs into Moodle using provided credentials."""
+    async def login(self) -> bool:
+        """
+        Logs into Moodle using provided credentials. Returns False if Moodle
+        rejects them; raises MoodleUnavailableError if Moodle can't be reached.
+        """
         try:
             # Get login token first
-            login_page = self.session.get(self.LOGIN_URL)
-            soup = BeautifulSoup(login_page.content, 'html.parser')
+            login_page = await self._fetch(self.LOGIN_URL)
+            soup = parse_html(login_page.content, LOGIN_FORM)
             logintoken_input = soup.find('input', {'name': 'logintoken'})
             
             if not logintoken_input:
@@ -36,11 +186,13 @@ class MoodleClient:
                 'logintoken': logintoken
             }
             
-            response = self.session.post(self.LOGIN_URL, data=payload)
+            response = await self._fetch(self.LOGIN_URL, data=payload)
             
             # Check for success (usually redirects to dashboard or has logout button)
-            if "Log out" in response.text or "Dashboard" in response.title.text:
+            page_title = parse_html(response.content, PAGE_TITLE).title
+            if "Log out" in response.text or (page_title and "Dashboard" in page_title.get_text()):
                 self.is_logged_in = True
+                self._logins += 1
                 return True
             else:
                 logger.warning(f"Login failed. Title: {soup.title.string if soup.title else 'No Title'}")
@@ -48,84 +200,137 @@ class MoodleClient:
                 print(f"DEBUG: Login failed for user {self.username}. Page Title: {soup.title.string if soup.title else 'No Title'}") 
                 return False
                 
+        except MoodleUnavailableError:
+            # An outage, not bad credentials
+            raise
         except Exception as e:
             logger.error(f"Error during Moodle login: {e}")
             return False
 
-    def get_assignments(self) -> Dict[str, List[Dict]]:
+    async def get_assignments(self) -> Dict[str, List[Dict]]:
         """
         Fetches assignments from the Calendar.
         Returns a dict with 'pending' and 'completed' lists.
         Since Moodle scraping is tricky, we'll infer status based on date for now.
         """
         if not self.is_logged_in:
-            if not self.login():
+            if not await self.login():
                  raise ValueError("Login failed")
 
         try:
-            # Step 1: Fetch Dashboard to get Teacher Mapping (Course -> Teacher)
-            # We need this for enriching assignments from any source
-            # This is an extra request but necessary for the "Teacher" requirement
-            response_my = self.session.get("http://lms.kiet.edu/moodle/my/")
-            soup_my = BeautifulSoup(response_my.content, 'html.parser')
-            course_map = self._scrape_course_mapping(soup_my)
-            logger.info(f"Found {len(course_map)} courses with teachers.")
-
-            # Step 2: Fetch Assignments from Calendar (Preferred Source)
-            response_cal = self.session.get(self.CALENDAR_URL + "?view=upcoming")
-            soup_cal = BeautifulSoup(response_cal.content, 'html.parser')
-            
-            assignments = []
-            
-            # Selector Strategy 1: Standard 'event' div (Boost theme)
-            events = soup_cal.find_all('div', class_='event')
-            if not events: events = soup_cal.find_all('div', class_='calendar_event_item')
-            if not events: events = soup_cal.find_all('div', class_='card')
-            if not events: events = soup_cal.find_all('li', class_='list-group-item')
-
-            for event in events:
-                title_elem = (
-                    event.find('h3', class_='name') or 
-                    event.find('a', class_='card-link') or
-                    event.find('a', class_='event-title') or
-                    event.find('h3', class_='h5')
-                )
-                date_elem = (
-                    event.find('div', class_='date') or 
-                    event.find('div', class_='row') or
-                    event.find('div', class_='text-muted')
-                )
-                course_elem = (
-                    event.find('div', class_='course') or
-                    event.find('span', class_='course') or
-                    event.find('div', class_='col-11') or
-                    event.find('small')
-                )
+            # The dashboard (teacher mapping, timeline fallback) and the calendar
+            # don't depend on each other, so both are fetched at the same time
+            response_my, response_cal = await asyncio.gather(
+                self._get(self.DASHBOARD_URL),
+                self._get(self.CALENDAR_URL + "?view=upcoming"),
+            )
+            return self.parse_assignments(response_my.content, response_cal.content)
+    
+        except Exception as e:
+            logger.error(f"Error fetching assignments: {e}")
+            # Re-raise invalid credentials and outages, otherwise return empty
+            if "Login failed" in str(e) or isinstance(e, MoodleUnavailableError):
+                raise e
+            return {"pending": [], "completed": []}
+
+    def parse_assignments(self, html_my: bytes, html_cal: bytes) -> Dict[str, List[Dict]]:
+        """Extracts the assignments from the dashboard and upcoming-calendar pages."""
+        # Step 1: Teacher Mapping (Course -> Teacher) from the Dashboard
+        # We need this for enriching assignments from any source
+        course_map = self._scrape_course_mapping(parse_html(html_my, COURSE_CARDS))
+        self.course_map = course_map
+        teachers = teacher_index(course_map)
+        logger.info(f"Found {len(course_map)} courses with teachers.")
 
+        # Step 2: Assignments from the Calendar (Preferred Source)
+        soup_cal = parse_html(html_cal, CALENDAR_EVENTS)
+        
+        assignments = []
+        
+        # Selector Strategy 1: Standard 'event' div (Boost theme)
+        events = soup_cal.find_all('div', class_='event')
+        if not events: events = soup_cal.find_all('div', class_='calendar_event_item')
+        if not events: events = soup_cal.find_all('div', class_='card')
+        if not events: events = soup_cal.find_all('li', class_='list-group-item')
+
+        for event in events:
+            title_elem = (
+                event.find('h3', class_='name') or 
+                event.find('a', class_='card-link') or
+                event.find('a', class_='event-title') or
+                event.find('h3', class_='h5')
+            )
+            date_elem = (
+                event.find('div', class_='date') or 
+                event.find('div', class_='row') or
+                event.find('div', class_='text-muted')
+            )
+            course_elem = (
+                event.find('div', class_='course') or
+                event.find('span', class_='course') or
+                event.find('div', class_='col-11') or
+                event.find('small')
+            )
+
+            if title_elem:
+                title = title_elem.get_text(strip=True)
+                date_str = date_elem.get_text(strip=True) if date_elem else "Upcoming"
+                
+                course = "Moodle Course"
+                if course_elem:
+                    course_text = course_elem.get_text(strip=True)
+                    if len(course_text) < 50: 
+                        course = course_text
+                
+                # Heuristic for course code in title
+                if ":" in title:
+                     parts = title.split(":", 1)
+                     prefix = parts[0].strip()
+                     if len(prefix) < 15 and any(c.isdigit() for c in prefix): 
+                         course = prefix
+                         title = parts[1].strip()
+
+                if len(date_str) > 50: 
+                    date_str = "See detailed view"
+                
+                # Enrich with Teacher
+                clean_course = self.clean_course_name(course)
+                teacher = teachers.lookup(clean_course)
+                display_course = f"{clean_course} ({teacher})" if teacher else clean_course
+
+                assignments.append({
+                    "title": title,
+                    "course": display_course,
+                    "status": "Left",
+                    "date": date_str
+                })
+
+        # Step 3: Fallback - Check Dashboard Timeline if Calendar is empty
+        if not assignments:
+            logger.info("Calendar returned no assignments, checking Dashboard Timeline...")
+            # Rare path, and its selectors can't share one strainer, so the whole page is parsed
+            soup_my = parse_html(html_my)
+            timeline_events = soup_my.find_all('div', class_='event-list-item') or \
+                              soup_my.find_all('div', {'data-region': 'event-list-item'}) or \
+                              soup_my.find_all('li', class_='list-group-item')
+
+            for event in timeline_events:
+                title_elem = event.find('h6', class_='event-name') or event.find('h3') or event.find('a')
+                date_elem = event.find('div', class_='text-muted') or event.find('time')
+                
+                course_name = "Moodle Course"
+                links = event.find_all('a', href=True)
+                for link in links:
+                    if 'course/view.php' in link['href']:
+                         course_name = link.get_text(strip=True)
+                         break
+                
                 if title_elem:
                     title = title_elem.get_text(strip=True)
                     date_str = date_elem.get_text(strip=True) if date_elem else "Upcoming"
                     
-                    course = "Moodle Course"
-                    if course_elem:
-                        course_text = course_elem.get_text(strip=True)
-                        if len(course_text) < 50: 
-                            course = course_text
-                    
-                    # Heuristic for course code in title
-                    if ":" in title:
-                         parts = title.split(":", 1)
-                         prefix = parts[0].strip()
-                         if len(prefix) < 15 and any(c.isdigit() for c in prefix): 
-                             course = prefix
-                             title = parts[1].strip()
-
-                    if len(date_str) > 50: 
-                        date_str = "See detailed view"
-                    
-                    # Enrich with Teacher
-                    clean_course = self.clean_course_name(course)
-                    teacher = self._find_teacher_for_course(clean_course, course_map)
+                    clean_course = self.clean_course_name(course_name)
+                    teacher = teachers.lookup(clean_course)
                     display_course = f"{clean_course} ({teacher})" if teacher else clean_course
 
                     assignments.append({
@@ -135,47 +340,34 @@ class MoodleClient:
                         "date": date_str
                     })
 
-            # Step 3: Fallback - Check Dashboard Timeline if Calendar is empty
-            if not assignments:
-                logger.info("Calendar returned no assignments, checking Dashboard Timeline...")
-                timeline_events = soup_my.find_all('div', class_='event-list-item') or \
-                                  soup_my.find_all('div', {'data-region': 'event-list-item'}) or \
-                                  soup_my.find_all('li', class_='list-group-item')
+        return self.process_assignments(assignments)
 
-                for event in timeline_events:
-                    title_elem = event.find('h6', class_='event-name') or event.find('h3') or event.find('a')
-                    date_elem = event.find('div', class_='text-muted') or event.find('time')
-                    
-                    course_name = "Moodle Course"
-                    links = event.find_all('a', href=True)
-                    for link in links:
-                        if 'course/view.php' in link['href']:
-                             course_name = link.get_text(strip=True)
-                             break
-                    
-                    if title_elem:
-                        title = title_elem.get_text(strip=True)
-                        date_str = date_elem.get_text(strip=True) if date_elem else "Upcoming"
-                        
-                        clean_course = self.clean_course_name(course_name)
-                        teacher = self._find_teacher_for_course(clean_course, course_map)
-                        display_course = f"{clean_course} ({teacher})" if teacher else clean_course
-
-                        assignments.append({
-                            "title": title,
-                            "course": display_course,
-                            "status": "Left",
-                            "date": date_str
-                        })
-
-            return self.process_assignments(assignments)
-    
-        except Exception as e:
-            logger.error(f"Error fetching assignments: {e}")
-            # Re-raise invalid credentials or return empty
-            if "Login failed" in str(e):
-                raise e
-            return {"pending": [], "completed": []}
+    async def get_calendar_export_url(self) -> Optional[str]:
+        """
+        Generates the student's calendar export (iCal) URL through Moodle's
+        export form. The URL carries its own auth token, so it can be fetched
+        without a session. Returns None if the form or URL can't be found.
+        """
+        form_page = await self._get(self.EXPORT_URL)
+        payload = {
+            field.get('name'): field.get('value', '')
+            for field in parse_html(form_page.content, EXPORT_FORM_FIELDS).find_all('input', type='hidden')
+            if field.get('name')
+        }
+        if 'sesskey' not in payload:
+            logger.warning("Could not find the calendar export form")
+            return None
+        payload.update({
+            'events[exportevents]': 'all',
+            'period[timeperiod]': 'recentupcoming',
+            'generateurl': 'Get calendar URL',
+        })
+        response = await self._fetch(self.EXPORT_URL, data=payload)
+        match = EXPORT_URL_PATTERN.search(response.text)
+        if not match:
+            logger.warning("Calendar export URL not found in Moodle's response")
+            return None
+        return html.unescape(match.group(0))
 
     def _scrape_course_mapping(self, soup) -> Dict[str, str]:
         """
@@ -206,13 +398,6 @@ class MoodleClient:
         
         return mapping
 
-    def _find_teacher_for_course(self, course_name, mapping):
-        # Fuzzy match course name to mapping keys
-        for k, v in mapping.items():
-            if course_name in k or k in course_name:
-                return v
-        return None
-
 
     def fetch_calendar_month(self):
         """Fallback: Parse month view for events."""
@@ -227,20 +412,14 @@ class MoodleClient:
         completed = []
         now = datetime.now()
         
-        from dateutil import parser
-        
         for assign in raw_assignments:
             date_str = assign['date']
             try:
                 # remove "Time:" prefix if present or other clutter
                 clean_date = date_str.replace("Time:", "").strip()
-                # Parse date - explicit fuzzy=True allows handling extra text
-                due_date = parser.parse(clean_date, fuzzy=True, dayfirst=True)
-                
-                # If no year is in the string, dateutil defaults to current year which is usually correct for upcoming
-                # However for "Friday, 12 January" in Dec, it might be next year.
-                # Heuristic: if due_date is more than 6 months in the past, maybe it's next year? 
-                # But Moodle usually includes year if it's not current year.
+                # Moodle's own formats are matched directly (picking the year when
+                # it is left out); anything else goes through dateutil's fuzzy parse
+                due_date = moodle_dates.parse(clean_date, now)
                 
                 if due_date < now:
                     assign['status'] = "Done" # Or Overdue, but user asked for "Done" count logic
@@ -263,6 +442,7 @@ class MoodleClient:
                 logger.warning(f"Could not parse date: {date_str} - {e}")
                 # Default to pending if we can't tell
                 pending.append(assign)
+        logger.debug(f"Due date parser so far: {moodle_dates.stats()}")
         
         # Post-process course names
         for assign in pending + completed:
@@ -273,7 +453,9 @@ class MoodleClient:
             "completed": completed
         }
 
-    def clean_course_name(self, raw_name: str) -> str:
+    @staticmethod
+    @functools.lru_cache(maxsize=COURSE_NAME_CACHE_SIZE)
+    def clean_course_name(raw_name: str) -> str:
         """
         Cleans messy Moodle course names.
         e.g. "2025-26_Web Development-1_CA102B_I_B_ANK" -> "Web Development-1"
@@ -283,8 +465,7 @@ class MoodleClient:
             
         # Common patterns to strip
         # 1. Year prefixes like "2025-26_"
-        import re
-        name = re.sub(r'^\d{4}-\d{2}[_ ]*', '', raw_name) # Remove 2025-26_
+        name = YEAR_PREFIX.sub('', raw_name) # Remove 2025-26_
         
         # 2. Semester/Code suffixes like "_CA102B_I_B_ANK"
         # We look for the first occurrence of huge underscores or code-like blocks
@@ -310,3 +491,51 @@ class MoodleClient:
         name = name.replace("Course name", "").strip()
         
         return name
+
+
+class MoodleSessionPool:
+    """
+    Bounded pool of logged-in MoodleClients keyed by Moodle username, so a
+    dashboard view reuses the session cookies instead of logging in again.
+    Idle clients expire after ttl seconds; beyond max_size the least recently
+    used one is dropped. Clients share one transport, so dropping them closes
+    nothing.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clients: "OrderedDict[str, Tuple[MoodleClient, float]]" = OrderedDict()
+
+    def _evict(self, now: float):
+        while self._clients:
+            _, last_used = next(iter(self._clients.values()))
+            if now - last_used <= self.ttl and len(self._clients) <= self.max_size:
+                break
+            self._clients.popitem(last=False)
+
+    def _checkout(self, username: str, password: str) -> MoodleClient:
+        # No awaits in here, so concurrent requests can't interleave
+        now = time.monotonic()
+        entry = self._clients.pop(username, None)
+        client = entry[0] if entry else None
+        if client is not None and (client.password != password or now - entry[1] > self.ttl):
+            # Changed credentials or an idle session Moodle has likely dropped
+            client = None
+        if client is None:
+            client = MoodleClient(username, password)
+        self._clients[username] = (client, now)
+        self._evict(now)
+        return client
+
+    @asynccontextmanager
+    async def client(self, username: str, password: str) -> AsyncIterator[MoodleClient]:
+        """Yields the pooled client for these credentials, held exclusively until the block exits."""
+        client = self._checkout(username, password)
+        async with client.lock:
+            yield client
+        if username in self._clients:
+            self._clients[username] = (client, time.monotonic())
+
+
+moodle_sessions = MoodleSessionPool(MOODLE_SESSION_POOL_SIZE, MOODLE_SESSION_TTL)
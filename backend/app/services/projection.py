@@ -0,0 +1,47 @@
+import json
+from datetime import date, datetime
+from fastapi import HTTPException
+from typing import Any, List, Optional
+from ..models import Student
+from ..schemas import StudentListItem
+
+try:
+    import orjson
+except ImportError:  # Falls back to the stdlib encoder
+    orjson = None
+
+# Columns a client may ask for with ?fields=. Moodle credentials are never selectable.
+SELECTABLE_FIELDS = [
+    "id", "roll_number", "email", "name", "section",
+    "github_username", "leetcode_username", "linkedin_url", "figma_url", "portfolio_url",
+    "skills_description", "bio_description",
+    "gmail_photo_url", "github_commits_count", "leetcode_points", "stats_status",
+    "last_refreshed_at",
+    "created_at", "updated_at",
+]
+
+COMPACT_FIELDS = list(StudentListItem.model_fields)
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parses a comma separated ?fields= value, always including id."""
+    if not fields:
+        return None
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in SELECTABLE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return ["id"] + [name for name in dict.fromkeys(requested) if name != "id"]
+
+def student_columns(fields: List[str]) -> list:
+    return [getattr(Student, name) for name in fields]
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def dumps(value: Any) -> bytes:
+    """Fast JSON encoding for projected rows (dicts of plain column values)."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, default=_default, separators=(",", ":")).encode()
@@ -0,0 +1,179 @@
+import asyncio
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+from typing import Iterable, Optional
+from ..models import Student, StudentRanking
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Ranking metric -> Student column it is computed from
+METRICS = {
+    "github": Student.github_commits_count,
+    "leetcode": Student.leetcode_points,
+}
+
+ALL_SCOPE = "all"
+
+# Ranking rows are shifted relative to each other, so async writers that touch
+# them take this lock to apply their changes one at a time
+ranking_write_lock = asyncio.Lock()
+
+# Key of the PostgreSQL advisory lock that does the same across processes
+RANKING_LOCK_KEY = 0x72616E6B  # "rank"
+
+def lock_rankings(db: Session):
+    """
+    Holds the ranking rows for the rest of the transaction, against other
+    processes (e.g. shard jobs running in other workers). On PostgreSQL this
+    is a transaction-level advisory lock; SQLite only lets one transaction
+    write at a time anyway.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": RANKING_LOCK_KEY})
+
+def percentile(rank: int, total: int) -> float:
+    """100 for the top, 100/total for the bottom. Computed when read, since it depends on the board size."""
+    return 100.0 * (total - rank + 1) / total
+
+def rebuild_rankings(db: Session, scopes: Optional[Iterable[str]] = None):
+    """
+    Recomputes the ranking rows for the given scopes ("all" and/or sections),
+    or for every scope. Used for seeding and when a student changes section.
+    Does not commit.
+    """
+    lock_rankings(db)
+    if scopes is None:
+        sections = [row[0] for row in db.query(Student.section).distinct()]
+        scopes = [ALL_SCOPE] + sections
+    scopes = set(scopes)
+
+    for metric, column in METRICS.items():
+        for scope in scopes:
+            query = db.query(Student.id, func.coalesce(column, 0))
+            if scope != ALL_SCOPE:
+                query = query.filter(Student.section == scope)
+            rows = sorted(query.all(), key=lambda row: row[1], reverse=True)
+
+            db.query(StudentRanking).filter(
+                StudentRanking.metric == metric,
+                StudentRanking.scope == scope
+            ).delete(synchronize_session=False)
+
+            mappings = []
+            rank = dense_rank = 0
+            previous = None
+            for position, (student_id, value) in enumerate(rows, start=1):
+                if value != previous:
+                    rank = position
+                    dense_rank += 1
+                    previous = value
+                mappings.append({
+                    "student_id": student_id,
+                    "metric": metric,
+                    "scope": scope,
+                    "value": value,
+                    "rank": rank,
+                    "dense_rank": dense_rank,
+                })
+            db.bulk_insert_mappings(StudentRanking, mappings)
+
+def ensure_rankings(db: Session):
+    """Seeds the ranking table on first start."""
+    if db.query(StudentRanking.id).first() is None:
+        rebuild_rankings(db)
+        db.commit()
+        logger.info("Ranking table seeded")
+
+def apply_rank_change(db: Session, student: Student, metric: str, new: int):
+    """
+    Moves one student to `new` within the rankings of every scope they belong
+    to, shifting only the rows between their ranked value and the new one.
+    The old value is read from the student's ranking row under the ranking
+    lock, not from the caller's snapshot: two writers holding the same stale
+    student would otherwise both shift the others. Does not commit.
+    """
+    new = new or 0
+    lock_rankings(db)
+
+    for scope in (ALL_SCOPE, student.section):
+        board = db.query(StudentRanking).filter(
+            StudentRanking.metric == metric,
+            StudentRanking.scope == scope
+        )
+        # populate_existing: a row loaded earlier in this session may have moved since
+        own = board.filter(StudentRanking.student_id == student.id).populate_existing().first()
+        if own is None:
+            # Student not ranked yet in this scope
+            rebuild_rankings(db, [scope])
+            continue
+        old = own.value
+        if old == new:
+            continue
+
+        others = board.filter(StudentRanking.student_id != student.id)
+
+        # Competition rank: the student now counts (or no longer counts) as
+        # "higher" for everyone between the old and the new value
+        if new > old:
+            others.filter(StudentRanking.value >= old, StudentRanking.value < new).update({
+                StudentRanking.rank: StudentRanking.rank + 1,
+            }, synchronize_session=False)
+        else:
+            others.filter(StudentRanking.value >= new, StudentRanking.value < old).update({
+                StudentRanking.rank: StudentRanking.rank - 1,
+            }, synchronize_session=False)
+
+        # Dense rank: only changes when a distinct value disappears or appears
+        if others.filter(StudentRanking.value == old).first() is None:
+            others.filter(StudentRanking.value < old).update({
+                StudentRanking.dense_rank: StudentRanking.dense_rank - 1,
+            }, synchronize_session=False)
+        if others.filter(StudentRanking.value == new).first() is None:
+            others.filter(StudentRanking.value < new).update({
+                StudentRanking.dense_rank: StudentRanking.dense_rank + 1,
+            }, synchronize_session=False)
+
+        higher = others.filter(StudentRanking.value > new)
+        rank = higher.count() + 1
+        dense_rank = higher.with_entities(func.count(func.distinct(StudentRanking.value))).scalar() + 1
+        own.value = new
+        own.rank = rank
+        own.dense_rank = dense_rank
+        # Sessions don't autoflush, and the next move's counts and range
+        # UPDATEs must see this row in its new place
+        db.flush()
+
+def add_to_rankings(db: Session, student: Student):
+    """
+    Ranks a new student in the "all" and section boards, shifting only the
+    rows below their values (none for a new student's zero counts).
+    Does not commit.
+    """
+    lock_rankings(db)
+    for metric, column in METRICS.items():
+        value = getattr(student, column.key) or 0
+        for scope in (ALL_SCOPE, student.section):
+            others = db.query(StudentRanking).filter(
+                StudentRanking.metric == metric,
+                StudentRanking.scope == scope,
+                StudentRanking.student_id != student.id
+            )
+            higher = others.filter(StudentRanking.value > value)
+            rank = higher.count() + 1
+            dense_rank = higher.with_entities(func.count(func.distinct(StudentRanking.value))).scalar() + 1
+
+            lower = others.filter(StudentRanking.value < value)
+            if others.filter(StudentRanking.value == value).first() is None:
+                lower.update({StudentRanking.dense_rank: StudentRanking.dense_rank + 1}, synchronize_session=False)
+            lower.update({StudentRanking.rank: StudentRanking.rank + 1}, synchronize_session=False)
+
+            db.add(StudentRanking(
+                student_id=student.id,
+                metric=metric,
+                scope=scope,
+                value=value,
+                rank=rank,
+                dense_rank=dense_rank,
+            ))
+    db.flush()
@@ -0,0 +1,71 @@
+import asyncio
+import os
+import time
+from typing import Dict
+
+class TokenBucket:
+    """
+    Async token bucket. Each call to acquire() takes one token, waiting for the
+    bucket to refill if it is empty. Calls that had to wait are counted as throttled.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.throttled = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        # The lock keeps waiters in FIFO order so no caller starves
+        async with self._lock:
+            waited = False
+            self._refill()
+            while self.tokens < 1:
+                waited = True
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+            if waited:
+                self.throttled += 1
+
+
+# Provider limits, configurable through env vars.
+# RATE is tokens (requests) per second, BURST is the bucket size.
+PROVIDER_LIMITS = {
+    "github_graphql": (
+        float(os.getenv("GITHUB_GRAPHQL_RATE", "1.0")),
+        int(os.getenv("GITHUB_GRAPHQL_BURST", "5")),
+    ),
+    "github_scrape": (
+        float(os.getenv("GITHUB_SCRAPE_RATE", "2.0")),
+        int(os.getenv("GITHUB_SCRAPE_BURST", "5")),
+    ),
+    "github_events": (
+        float(os.getenv("GITHUB_EVENTS_RATE", "1.0")),
+        int(os.getenv("GITHUB_EVENTS_BURST", "5")),
+    ),
+    "leetcode": (
+        float(os.getenv("LEETCODE_RATE", "2.0")),
+        int(os.getenv("LEETCODE_BURST", "5")),
+    ),
+}
+
+_limiters: Dict[str, TokenBucket] = {}
+
+def get_limiter(provider: str) -> TokenBucket:
+    """Returns the shared token bucket for a provider."""
+    if provider not in _limiters:
+        rate, burst = PROVIDER_LIMITS[provider]
+        _limiters[provider] = TokenBucket(rate, burst)
+    return _limiters[provider]
+
+def total_throttled() -> int:
+    """Total number of throttled calls across all providers since startup."""
+    return sum(limiter.throttled for limiter in _limiters.values())
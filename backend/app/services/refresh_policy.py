@@ -0,0 +1,29 @@
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict
+from ..models import Student
+
+# Students whose counts just changed are refreshed every REFRESH_MIN_INTERVAL;
+# each unchanged refresh multiplies the interval by REFRESH_BACKOFF, up to
+# REFRESH_MAX_INTERVAL. Failed refreshes are retried after REFRESH_RETRY_DELAY.
+REFRESH_MIN_INTERVAL = int(os.getenv("REFRESH_MIN_INTERVAL", "1800"))
+REFRESH_MAX_INTERVAL = int(os.getenv("REFRESH_MAX_INTERVAL", "172800"))
+REFRESH_BACKOFF = float(os.getenv("REFRESH_BACKOFF", "2"))
+REFRESH_RETRY_DELAY = int(os.getenv("REFRESH_RETRY_DELAY", "900"))
+# Spreads refreshes out so students registered together don't stay in lockstep
+REFRESH_JITTER = 0.1
+
+def _jittered(seconds: float) -> timedelta:
+    return timedelta(seconds=seconds * random.uniform(1 - REFRESH_JITTER, 1 + REFRESH_JITTER))
+
+def schedule_after_success(student: Student, changed: bool, now: datetime) -> Dict[str, Any]:
+    """Column values that schedule the student's next refresh."""
+    if changed or not student.refresh_interval:
+        interval = REFRESH_MIN_INTERVAL
+    else:
+        interval = min(int(student.refresh_interval * REFRESH_BACKOFF), REFRESH_MAX_INTERVAL)
+    return {"refresh_interval": interval, "next_refresh_at": now + _jittered(interval)}
+
+def schedule_after_failure(student: Student, now: datetime) -> Dict[str, Any]:
+    return {"next_refresh_at": now + _jittered(REFRESH_RETRY_DELAY)}
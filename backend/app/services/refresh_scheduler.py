@@ -0,0 +1,150 @@
+import logging
+import os
+import time
+from collections import deque
+from datetime import timedelta
+from typing import Deque, List, Tuple
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import AsyncSessionLocal
+from ..models import Student, JOB_SHARD
+from .history_service import compact_history
+from .job_queue import enqueue_job
+from .leases import acquire_lease, release_lease
+from .refresh_policy import REFRESH_RETRY_DELAY
+from .timeutil import utcnow
+
+logger = logging.getLogger(__name__)
+
+# Upstream lookups (one per linked GitHub / LeetCode profile) allowed per hour
+REFRESH_HOURLY_BUDGET = int(os.getenv("REFRESH_HOURLY_BUDGET", "2000"))
+# Seconds between scheduler ticks
+REFRESH_TICK_SECONDS = int(os.getenv("REFRESH_TICK_SECONDS", "60"))
+# Most students refreshed by a single tick
+REFRESH_TICK_MAX_STUDENTS = int(os.getenv("REFRESH_TICK_MAX_STUDENTS", "200"))
+# Due students are split into jobs of this size, so every worker process can take a share
+REFRESH_SHARD_SIZE = int(os.getenv("REFRESH_SHARD_SIZE", "25"))
+
+# Only the process holding this lease runs the scheduler tick; the lease
+# outlives a few missed ticks before another process takes over
+SCHEDULER_LEASE = "refresh_scheduler"
+SCHEDULER_LEASE_TTL = REFRESH_TICK_SECONDS * 3
+# Taken by whichever process runs the daily compaction first; outlives the
+# other processes' runs that day
+COMPACTION_LEASE = "history_compaction"
+COMPACTION_LEASE_TTL = 12 * 3600
+
+BUDGET_WINDOW = 3600.0
+
+class HourlyBudget:
+    """
+    Sliding one-hour window of spent upstream calls. Kept by the scheduler
+    leader; a new leader starts with a fresh window.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._spent: Deque[Tuple[float, int]] = deque()
+        self._total = 0
+
+    def _expire(self):
+        cutoff = time.monotonic() - BUDGET_WINDOW
+        while self._spent and self._spent[0][0] < cutoff:
+            self._total -= self._spent.popleft()[1]
+
+    def remaining(self) -> int:
+        self._expire()
+        return max(0, self.limit - self._total)
+
+    def spend(self, calls: int):
+        if calls:
+            self._spent.append((time.monotonic(), calls))
+            self._total += calls
+
+
+budget = HourlyBudget(REFRESH_HOURLY_BUDGET)
+
+def _cost(student: Student) -> int:
+    return int(bool(student.github_username)) + int(bool(student.leetcode_username))
+
+async def _due_students(db: AsyncSession, limit: int) -> Tuple[List[Student], int]:
+    """Most overdue students first (never refreshed ones before all others), within the budget."""
+    allowance = budget.remaining()
+    if allowance <= 0:
+        return [], 0
+
+    candidates = (await db.execute(
+        select(Student)
+        .where(
+            or_(Student.next_refresh_at.is_(None), Student.next_refresh_at <= utcnow()),
+            or_(Student.github_username.isnot(None), Student.leetcode_username.isnot(None))
+        )
+        .order_by(Student.next_refresh_at.asc().nulls_first(), Student.id)
+        .limit(min(limit, allowance))
+    )).scalars().all()
+
+    selected, cost = [], 0
+    for student in candidates:
+        student_cost = _cost(student)
+        if cost + student_cost > allowance:
+            break
+        selected.append(student)
+        cost += student_cost
+    return selected, cost
+
+async def run_due_refreshes():
+    """
+    Scheduler tick: queues refresh jobs for the students whose next_refresh_at
+    has passed. Active students come due often and dormant ones rarely (see
+    refresh_policy), so upstream calls go where counts are actually moving.
+    Every worker process ticks, but only the lease holder does anything; the
+    shard jobs it queues are run by whichever workers claim them.
+    """
+    try:
+        async with AsyncSessionLocal() as db:
+            if not await acquire_lease(db, SCHEDULER_LEASE, SCHEDULER_LEASE_TTL):
+                return
+
+            students, cost = await _due_students(db, REFRESH_TICK_MAX_STUDENTS)
+            if not students:
+                await db.commit()
+                return
+            student_ids = sorted(student.id for student in students)
+
+            # Push them out of the due set so the next tick doesn't queue them again;
+            # the refresh itself sets the real next_refresh_at
+            await db.execute(
+                update(Student)
+                .where(Student.id.in_(student_ids))
+                .values(next_refresh_at=utcnow() + timedelta(seconds=REFRESH_RETRY_DELAY))
+            )
+            await db.commit()
+            budget.spend(cost)
+
+            for start in range(0, len(student_ids), REFRESH_SHARD_SIZE):
+                await enqueue_job(db, JOB_SHARD, student_ids=student_ids[start:start + REFRESH_SHARD_SIZE])
+        logger.info(
+            f"Adaptive refresh: queued {len(student_ids)} due students, "
+            f"{budget.remaining()} calls left this hour"
+        )
+    except Exception as e:
+        logger.error(f"Error in adaptive refresh tick: {e}")
+
+async def run_history_compaction():
+    """Daily job: downsamples old stats history, once per deployment."""
+    try:
+        async with AsyncSessionLocal() as db:
+            if not await acquire_lease(db, COMPACTION_LEASE, COMPACTION_LEASE_TTL):
+                return
+            removed = await db.run_sync(compact_history)
+        logger.info(f"Stats history compacted: {removed} rows removed")
+    except Exception as e:
+        logger.error(f"Error compacting stats history: {e}")
+
+async def step_down():
+    """Releases scheduler leadership on shutdown."""
+    try:
+        async with AsyncSessionLocal() as db:
+            await release_lease(db, SCHEDULER_LEASE)
+    except Exception as e:
+        logger.error(f"Error releasing scheduler lease: {e}")
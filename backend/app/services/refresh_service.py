@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import Student
+from .http_cache import validator_cache
+from .github_service import GITHUB_TOKEN, get_github_commits_batch
+from .leetcode_service import get_leetcode_stats_batch
+from .rate_limiter import total_throttled
+from .stats_service import StatsWriter, refresh_stats
+
+logger = logging.getLogger(__name__)
+
+# Max number of students refreshed at the same time. Actual request rate is
+# bounded by the per-provider token buckets in rate_limiter.
+REFRESH_CONCURRENCY = int(os.getenv("REFRESH_CONCURRENCY", "8"))
+
+@dataclass
+class SweepSummary:
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    throttled: int = 0
+    duration: float = 0.0
+
+    def __str__(self):
+        return (
+            f"{self.total} students in {self.duration:.1f}s - "
+            f"{self.succeeded} succeeded, {self.failed} failed, {self.throttled} throttled calls"
+        )
+
+async def run_sweep(
+    db: AsyncSession,
+    students: Optional[List[Student]] = None,
+    concurrency: int = REFRESH_CONCURRENCY,
+    on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None
+) -> SweepSummary:
+    """
+    Refreshes stats for the given students (all students by default) with
+    bounded concurrency and returns a summary of the sweep.
+    on_progress(done, total) is awaited after each student.
+    """
+    if students is None:
+        students = (await db.execute(select(Student))).scalars().all()
+    # Don't hold a connection while the providers respond
+    await db.commit()
+
+    summary = SweepSummary(total=len(students))
+    throttled_before = total_throttled()
+    started = time.monotonic()
+    semaphore = asyncio.Semaphore(concurrency)
+    # Results are written in batches rather than one transaction per student
+    writer = StatsWriter(db)
+
+    # Resolve counts with aliased GraphQL batches first; users left out of the
+    # results go through the per-user fallback paths below.
+    github_counts, leetcode_counts = await asyncio.gather(
+        get_github_commits_batch(
+            [student.github_username for student in students if student.github_username]
+        ),
+        get_leetcode_stats_batch(
+            [student.leetcode_username for student in students if student.leetcode_username]
+        ),
+    )
+
+    async def refresh_one(student: Student):
+        async with semaphore:
+            try:
+                ok = await refresh_stats(
+                    db,
+                    student,
+                    github_commits=github_counts.get(student.github_username),
+                    leetcode_points=leetcode_counts.get(student.leetcode_username),
+                    github_graphql=not GITHUB_TOKEN,
+                    writer=writer
+                )
+            except Exception as e:
+                logger.error(f"Error refreshing student {student.id}: {e}")
+                ok = False
+        if ok:
+            summary.succeeded += 1
+        else:
+            summary.failed += 1
+        if on_progress:
+            await on_progress(summary.succeeded + summary.failed, summary.total)
+
+    await asyncio.gather(*(refresh_one(student) for student in students))
+    await writer.flush()
+
+    summary.duration = time.monotonic() - started
+    summary.throttled = total_throttled() - throttled_before
+    validator_cache.save()
+    return summary
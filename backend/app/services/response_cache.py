@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, Iterable, Optional, Tuple, Union
+from fastapi import Request, Response
+from sqlalchemy.exc import IntegrityError
+from ..database import SessionLocal
+from ..models import CacheGeneration
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+# How often a worker reads the generations bumped by the other workers
+RESPONSE_CACHE_SYNC_INTERVAL = float(os.getenv("RESPONSE_CACHE_SYNC_INTERVAL", "1"))
+
+# (bumps made in this process, shared generation last read from the database)
+Generation = Tuple[int, int]
+
+# Cache namespaces, each with its own generation counter
+DIRECTORY = "directory"
+RANKINGS = "rankings"
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    created_at: float
+    headers: Dict[str, str] = field(default_factory=dict)
+
+def _publish_bump(namespaces: Iterable[str]):
+    """Increments the shared generations, so the other workers drop their entries too."""
+    db = SessionLocal()
+    try:
+        for _ in range(2):
+            try:
+                for namespace in namespaces:
+                    updated = db.query(CacheGeneration).filter(CacheGeneration.namespace == namespace).update(
+                        {CacheGeneration.generation: CacheGeneration.generation + 1},
+                        synchronize_session=False
+                    )
+                    if not updated:
+                        db.add(CacheGeneration(namespace=namespace, generation=1))
+                db.commit()
+                return
+            except IntegrityError:
+                # Another worker created the row first; bump it instead
+                db.rollback()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Could not publish response cache bump for {namespaces}: {e}")
+    finally:
+        db.close()
+
+def _read_generations() -> Dict[str, int]:
+    db = SessionLocal()
+    try:
+        return dict(db.query(CacheGeneration.namespace, CacheGeneration.generation).all())
+    finally:
+        db.close()
+
+class ResponseCache:
+    """
+    LRU + TTL cache of serialized JSON responses. Entries are keyed by the
+    generation of their namespace, so bumping a generation invalidates every
+    response built from older data without scanning the cache. A bump takes
+    effect in this process at once and, through the cache_generations table,
+    in the other worker processes within sync_interval seconds.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, sync_interval: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.sync_interval = sync_interval
+        self.generations: Dict[str, int] = {}
+        self.shared_generations: Dict[str, int] = {}
+        self._synced_at = float("-inf")
+        self._entries: "OrderedDict[Tuple, CachedResponse]" = OrderedDict()
+        # Sync routes read the cache from FastAPI's threadpool
+        self._lock = threading.Lock()
+
+    def bump(self, *namespaces: str):
+        with self._lock:
+            for namespace in namespaces:
+                self.generations[namespace] = self.generations.get(namespace, 0) + 1
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            _publish_bump(namespaces)
+        else:
+            # Keep the database write off the event loop
+            loop.run_in_executor(None, _publish_bump, namespaces)
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._synced_at < self.sync_interval:
+            return
+        self._synced_at = now
+        try:
+            self.shared_generations = _read_generations()
+        except Exception as e:
+            logger.warning(f"Could not read shared response cache generations: {e}")
+
+    def generation(self, namespace: str) -> Generation:
+        self._sync()
+        return self.generations.get(namespace, 0), self.shared_generations.get(namespace, 0)
+
+    def get(self, namespace: str, key: Hashable) -> Optional[CachedResponse]:
+        full_key = (namespace, self.generation(namespace), key)
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry.created_at > self.ttl:
+                del self._entries[full_key]
+                return None
+            self._entries.move_to_end(full_key)
+            return entry
+
+    def set(
+        self,
+        namespace: str,
+        key: Hashable,
+        body: bytes,
+        generation: Generation,
+        headers: Optional[Dict[str, str]] = None
+    ) -> CachedResponse:
+        """Stores body under the generation that was current when it was built."""
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        entry = CachedResponse(body=body, etag=etag, created_at=time.monotonic(), headers=headers or {})
+        with self._lock:
+            self._entries[(namespace, generation, key)] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL, RESPONSE_CACHE_SYNC_INTERVAL)
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+def cached_json_response(
+    request: Request,
+    namespace: str,
+    key: Hashable,
+    build: Callable[[], Union[bytes, Tuple[bytes, Dict[str, str]]]]
+) -> Response:
+    """
+    Returns the cached JSON body for key, building it on a miss. build returns
+    the body, or (body, extra headers). Answers with 304 Not Modified when the
+    client already holds the current ETag.
+    """
+    entry = response_cache.get(namespace, key)
+    if entry is None:
+        # Read the generation before building, so a bump during the build is not lost
+        generation = response_cache.generation(namespace)
+        built = build()
+        body, extra_headers = built if isinstance(built, tuple) else (built, None)
+        entry = response_cache.set(namespace, key, body, generation, extra_headers)
+
+    headers = {**entry.headers, "ETag": entry.etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
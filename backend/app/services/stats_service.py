@@ -1,43 +1,238 @@
+import asyncio
+import os
+import time
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ..models import Student
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import Any, Dict, List, Optional, Tuple
+from ..models import Student, StatsHistory, STATS_READY
 from .github_service import get_github_commits
+from .history_service import history_rows
 from .leetcode_service import get_leetcode_stats
+from .ranking_service import METRICS, apply_rank_change, ranking_write_lock
+from .refresh_policy import schedule_after_failure, schedule_after_success
+from .response_cache import DIRECTORY, RANKINGS, response_cache
+from .timeutil import utcnow
 import logging
 
 logger = logging.getLogger(__name__)
 
-async def update_student_stats(db: Session, student: Student):
+# A sweep's StatsWriter commits after this many changed students or seconds, whichever comes first
+STATS_WRITE_BATCH = int(os.getenv("STATS_WRITE_BATCH", "100"))
+STATS_WRITE_INTERVAL = float(os.getenv("STATS_WRITE_INTERVAL", "5"))
+
+async def update_student_stats(db: AsyncSession, student: Student):
     """
     Updates the GitHub commits and LeetCode points for a given student.
     """
-    changes_made = False
-    
-    # Update GitHub Stats
-    if student.github_username:
-        try:
-            commits = await get_github_commits(student.github_username)
-            if commits is not None and commits != student.github_commits_count:
-                student.github_commits_count = commits
-                changes_made = True
-            elif commits is None:
-                logger.warning(f"Failed to fetch GitHub commits for {student.name}")
-        except Exception as e:
-            logger.error(f"Error updating GitHub stats for {student.name}: {e}")
-
-    # Update LeetCode Stats
-    if student.leetcode_username:
-        try:
-            points = await get_leetcode_stats(student.leetcode_username)
-            if points is not None and points != student.leetcode_points:
-                student.leetcode_points = points
-                changes_made = True
-            elif points is None:
-                logger.warning(f"Failed to fetch LeetCode stats for {student.name}")
-        except Exception as e:
-            logger.error(f"Error updating LeetCode stats for {student.name}: {e}")
-
-    if changes_made:
-        db.commit()
-        db.refresh(student)
-    
+    # End the read transaction so no connection is held while the providers respond
+    await db.commit()
+    # save_stats updates the loaded row in place, so no reload is needed
+    await refresh_stats(db, student)
     return student
+
+async def refresh_stats(
+    db: AsyncSession,
+    student: Student,
+    github_commits: Optional[int] = None,
+    leetcode_points: Optional[int] = None,
+    github_graphql: bool = True,
+    writer: Optional["StatsWriter"] = None
+) -> bool:
+    """
+    Same as update_student_stats, but returns False if any provider lookup failed.
+    Values already fetched in a batch are used instead of calling the provider.
+    Pass github_graphql=False when the batch query already tried GraphQL for this user.
+    With a writer the result is queued for its next batch instead of committed here.
+    """
+    # Both providers are queried at the same time
+    commits, points = await asyncio.gather(
+        _fetch_github(student, github_commits, github_graphql),
+        _fetch_leetcode(student, leetcode_points),
+    )
+    ok = (
+        (not student.github_username or commits is not None) and
+        (not student.leetcode_username or points is not None)
+    )
+
+    stats_status = STATS_READY if ok else None
+    if writer is not None:
+        await writer.add(student, commits, points, stats_status=stats_status, refresh_ok=ok)
+    else:
+        await save_stats(db, student, commits, points, stats_status=stats_status, refresh_ok=ok)
+    return ok
+
+async def _fetch_github(student: Student, prefetched: Optional[int], use_graphql: bool) -> Optional[int]:
+    if not student.github_username:
+        return None
+    if prefetched is not None:
+        return prefetched
+    try:
+        commits = await get_github_commits(student.github_username, use_graphql=use_graphql)
+        if commits is None:
+            logger.warning(f"Failed to fetch GitHub commits for {student.name}")
+        return commits
+    except Exception as e:
+        logger.error(f"Error updating GitHub stats for {student.name}: {e}")
+        return None
+
+async def _fetch_leetcode(student: Student, prefetched: Optional[int]) -> Optional[int]:
+    if not student.leetcode_username:
+        return None
+    if prefetched is not None:
+        return prefetched
+    try:
+        points = await get_leetcode_stats(student.leetcode_username)
+        if points is None:
+            logger.warning(f"Failed to fetch LeetCode stats for {student.name}")
+        return points
+    except Exception as e:
+        logger.error(f"Error updating LeetCode stats for {student.name}: {e}")
+        return None
+
+COUNT_COLUMNS = ("github_commits_count", "leetcode_points")
+
+def _stats_values(
+    student: Student,
+    commits: Optional[int],
+    points: Optional[int],
+    stats_status: Optional[str],
+    refresh_ok: Optional[bool]
+) -> Dict[str, Any]:
+    """Column values that differ from the student's current ones."""
+    values: Dict[str, Any] = {}
+    if commits is not None and commits != student.github_commits_count:
+        values["github_commits_count"] = commits
+    if points is not None and points != student.leetcode_points:
+        values["leetcode_points"] = points
+    if stats_status is not None and stats_status != student.stats_status:
+        values["stats_status"] = stats_status
+
+    now = utcnow()
+    if refresh_ok:
+        values["last_refreshed_at"] = now
+        values.update(schedule_after_success(student, any(c in values for c in COUNT_COLUMNS), now))
+    elif refresh_ok is not None:
+        values.update(schedule_after_failure(student, now))
+    return values
+
+def _is_visible(values: Dict[str, Any]) -> bool:
+    """Whether the change shows up in listings (refresh bookkeeping alone doesn't)."""
+    return any(c in values for c in COUNT_COLUMNS) or "stats_status" in values
+
+async def save_stats(
+    db: AsyncSession,
+    student: Student,
+    commits: Optional[int],
+    points: Optional[int],
+    stats_status: Optional[str] = None,
+    refresh_ok: Optional[bool] = None
+) -> bool:
+    """
+    Writes changed counts and moves the student in the ranking table.
+    None means the value could not be fetched (or the status is unchanged)
+    and is left untouched. refresh_ok is passed after a refresh attempt and
+    reschedules the student's next refresh. Returns True if anything changed.
+    """
+    async with ranking_write_lock:
+        values = _stats_values(student, commits, points, stats_status, refresh_ok)
+        if not values:
+            return False
+        for column, value in values.items():
+            setattr(student, column, value)
+
+        if not _is_visible(values):
+            await db.commit()
+            return False
+
+        history = history_rows(student.id, values, utcnow())
+        if history:
+            await db.execute(insert(StatsHistory), history)
+
+        # Keep the ranking table in step, touching only the rows between old and new values
+        await db.flush()
+        await db.run_sync(_apply_rank_changes, [(student, values)])
+        await db.commit()
+        response_cache.bump(DIRECTORY, RANKINGS)
+        return True
+
+def _apply_rank_changes(db: Session, moves: List[Tuple[Student, Dict[str, Any]]]):
+    for student, values in moves:
+        for metric, column in METRICS.items():
+            if column.key in values:
+                apply_rank_change(db, student, metric, values[column.key])
+
+class StatsWriter:
+    """
+    Batches the writes of a sweep: results are collected and written with one
+    bulk UPDATE (executemany) and one transaction per STATS_WRITE_BATCH rows or
+    STATS_WRITE_INTERVAL seconds, instead of a commit per student. Only changed
+    columns are written. Call flush() once the sweep is done.
+    """
+
+    def __init__(self, db: AsyncSession, batch_size: int = STATS_WRITE_BATCH, interval: float = STATS_WRITE_INTERVAL):
+        self.db = db
+        self.batch_size = batch_size
+        self.interval = interval
+        self._pending: Dict[int, Tuple[Student, Dict[str, Any]]] = {}
+        self._last_flush = time.monotonic()
+
+    async def add(
+        self,
+        student: Student,
+        commits: Optional[int],
+        points: Optional[int],
+        stats_status: Optional[str] = None,
+        refresh_ok: Optional[bool] = None
+    ):
+        values = _stats_values(student, commits, points, stats_status, refresh_ok)
+        if values:
+            if student.id in self._pending:
+                self._pending[student.id][1].update(values)
+            else:
+                self._pending[student.id] = (student, values)
+        if len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.interval:
+            await self.flush()
+
+    async def flush(self):
+        batch, self._pending = self._pending, {}
+        self._last_flush = time.monotonic()
+        if not batch:
+            return
+
+        async with ranking_write_lock:
+            try:
+                # ORM bulk UPDATE by primary key; rows with the same set of
+                # changed columns go out as a single executemany
+                await self.db.execute(
+                    update(Student),
+                    [{"id": student_id, **values} for student_id, (_, values) in batch.items()]
+                )
+                now = utcnow()
+                history = [
+                    row
+                    for student_id, (_, values) in batch.items()
+                    for row in history_rows(student_id, values, now)
+                ]
+                if history:
+                    await self.db.execute(insert(StatsHistory), history)
+                # apply_rank_change takes the old counts from the ranking rows
+                moves = [
+                    (student, values)
+                    for student, values in batch.values()
+                    if any(c in values for c in COUNT_COLUMNS)
+                ]
+                if moves:
+                    await self.db.run_sync(_apply_rank_changes, moves)
+                await self.db.commit()
+            except Exception:
+                await self.db.rollback()
+                raise
+
+        # Bring the loaded rows in line without marking them dirty
+        for student, values in batch.values():
+            for column, value in values.items():
+                set_committed_value(student, column, value)
+        if any(_is_visible(values) for _, values in batch.values()):
+            response_cache.bump(DIRECTORY, RANKINGS)
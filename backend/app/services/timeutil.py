@@ -0,0 +1,16 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """SQLite hands timestamps back without tzinfo; they are always stored as UTC."""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def age_seconds(value: Optional[datetime]) -> Optional[float]:
+    if value is None:
+        return None
+    return (utcnow() - as_utc(value)).total_seconds()
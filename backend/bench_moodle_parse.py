@@ -0,0 +1,96 @@
+"""
+Parse-time benchmark for the Moodle scraper, over saved pages.
+
+Save fixture pages (logs in with MOODLE_USERNAME / MOODLE_PASSWORD):
+    python bench_moodle_parse.py save [DIR]
+Time the parsing of every saved page pair:
+    python bench_moodle_parse.py run [DIR] [REPEAT]
+
+Pages are stored as DIR/<name>.my.html and DIR/<name>.calendar.html. They
+contain the student's personal data, so the default DIR is git-ignored.
+"""
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+from bs4 import BeautifulSoup
+from dotenv import load_dotenv
+from app.services import moodle_service
+from app.services.moodle_dates import moodle_dates
+from app.services.moodle_service import CALENDAR_EVENTS, COURSE_CARDS, HTML_PARSER, MoodleClient, parse_html
+
+load_dotenv()
+
+DEFAULT_DIR = "moodle_fixtures"
+
+def legacy_parse_html(markup, parse_only=None):
+    """What every page went through before: a full html.parser tree."""
+    return BeautifulSoup(markup, "html.parser")
+
+async def save_pages(directory: Path):
+    client = MoodleClient(os.getenv("MOODLE_USERNAME"), os.getenv("MOODLE_PASSWORD"))
+    if not await client.login():
+        sys.exit("Login failed")
+    response_my, response_cal = await asyncio.gather(
+        client._get(client.DASHBOARD_URL),
+        client._get(client.CALENDAR_URL + "?view=upcoming"),
+    )
+    directory.mkdir(parents=True, exist_ok=True)
+    name = datetime.now().strftime("%Y%m%d-%H%M%S")
+    (directory / f"{name}.my.html").write_bytes(response_my.content)
+    (directory / f"{name}.calendar.html").write_bytes(response_cal.content)
+    print(f"Saved {name}.my.html and {name}.calendar.html to {directory}")
+
+def median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def run(directory: Path, repeat: int):
+    pairs = sorted(directory.glob("*.my.html"))
+    if not pairs:
+        sys.exit(f"No fixture pages in {directory}; save some with: python bench_moodle_parse.py save")
+
+    client = MoodleClient("bench", "bench")
+    # Per-assignment warnings (e.g. unparsed dates) would drown the table
+    logging.getLogger(moodle_service.__name__).setLevel(logging.ERROR)
+    print(f"Parser: {HTML_PARSER}, median of {repeat} runs\n")
+    print(f"{'page':<32}{'before ms':>11}{'after ms':>11}{'speedup':>9}  same result")
+    for my_path in pairs:
+        name = my_path.name[:-len(".my.html")]
+        html_my = my_path.read_bytes()
+        html_cal = (directory / f"{name}.calendar.html").read_bytes()
+
+        # Parsing alone: full html.parser trees vs. the targeted regions
+        for page, html, region in (("my", html_my, COURSE_CARDS), ("calendar", html_cal, CALENDAR_EVENTS)):
+            before = median_ms(lambda: legacy_parse_html(html), repeat)
+            after = median_ms(lambda: parse_html(html, region), repeat)
+            print(f"{name + '.' + page:<32}{before:>11.2f}{after:>11.2f}{before / after:>8.1f}x")
+
+        # The whole extraction, which must give the same assignments either way
+        with patch.object(moodle_service, "parse_html", legacy_parse_html):
+            legacy_result = client.parse_assignments(html_my, html_cal)
+            before = median_ms(lambda: client.parse_assignments(html_my, html_cal), repeat)
+        result = client.parse_assignments(html_my, html_cal)
+        after = median_ms(lambda: client.parse_assignments(html_my, html_cal), repeat)
+        same = "yes" if result == legacy_result else "NO"
+        print(f"{name + ' (extraction)':<32}{before:>11.2f}{after:>11.2f}{before / after:>8.1f}x  {same}")
+
+    # Misses are due dates in a format the fast parser doesn't know, left to dateutil
+    print(f"\nDue dates: {moodle_dates.stats()}")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "run"
+    directory = Path(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_DIR)
+    if command == "save":
+        asyncio.run(save_pages(directory))
+    else:
+        run(directory, int(sys.argv[3]) if len(sys.argv) > 3 else 20)
@@ -0,0 +1,40 @@
+import os
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# Load env vars
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    DATABASE_URL = "sqlite:///./kietmap.db"
+    print("Using SQLite fallback")
+else:
+    print("Using provided DATABASE_URL")
+
+engine = create_engine(DATABASE_URL)
+
+# Indexes added to models.Student after the table was first created.
+# create_all() only creates indexes together with new tables, so existing
+# databases need them added here.
+INDEXES = {
+    "ix_students_section_roll_number": "students (section, roll_number)",
+    "ix_students_section_github_commits_count": "students (section, github_commits_count)",
+    "ix_students_section_leetcode_points": "students (section, leetcode_points)",
+    "ix_students_next_refresh_at": "students (next_refresh_at)",
+}
+
+def run_migration():
+    with engine.connect() as connection:
+        for name, target in INDEXES.items():
+            try:
+                print(f"Creating index {name}...")
+                connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {target}"))
+                print(f"SUCCESS: {name} created.")
+            except Exception as e:
+                print(f"INFO: {name} might already exist or error: {e}")
+
+        connection.commit()
+
+if __name__ == "__main__":
+    run_migration()
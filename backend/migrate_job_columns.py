@@ -0,0 +1,37 @@
+import os
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# Load env vars
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    DATABASE_URL = "sqlite:///./kietmap.db"
+    print("Using SQLite fallback")
+else:
+    print("Using provided DATABASE_URL")
+
+engine = create_engine(DATABASE_URL)
+
+# Columns added to models.RefreshJob after the table was first created
+COLUMNS = {
+    "student_ids": "TEXT",
+    "locked_by": "VARCHAR",
+    "lease_expires_at": "TIMESTAMP WITH TIME ZONE",
+}
+
+def run_migration():
+    with engine.connect() as connection:
+        for name, column_type in COLUMNS.items():
+            try:
+                print(f"Attempting to add {name}...")
+                connection.execute(text(f"ALTER TABLE refresh_jobs ADD COLUMN {name} {column_type}"))
+                connection.commit()
+                print(f"SUCCESS: {name} added.")
+            except Exception as e:
+                connection.rollback()
+                print(f"INFO: {name} might already exist or error: {e}")
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,31 @@
+import os
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# Load env vars
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    DATABASE_URL = "sqlite:///./kietmap.db"
+    print("Using SQLite fallback")
+else:
+    print("Using provided DATABASE_URL")
+
+engine = create_engine(DATABASE_URL)
+
+# student_rankings.percentile is now computed when the rankings are read. The
+# app no longer writes it, so the NOT NULL column has to go (SQLite 3.35+).
+def run_migration():
+    with engine.connect() as connection:
+        try:
+            print("Attempting to drop student_rankings.percentile...")
+            connection.execute(text("ALTER TABLE student_rankings DROP COLUMN percentile"))
+            connection.commit()
+            print("SUCCESS: percentile dropped.")
+        except Exception as e:
+            connection.rollback()
+            print(f"INFO: percentile might already be gone or error: {e}")
+
+if __name__ == "__main__":
+    run_migration()
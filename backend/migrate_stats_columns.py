@@ -0,0 +1,38 @@
+import os
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# Load env vars
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    DATABASE_URL = "sqlite:///./kietmap.db"
+    print("Using SQLite fallback")
+else:
+    print("Using provided DATABASE_URL")
+
+engine = create_engine(DATABASE_URL)
+
+# Stats bookkeeping columns added to models.Student after the table was first created
+COLUMNS = {
+    "stats_status": "VARCHAR",
+    "last_refreshed_at": "TIMESTAMP WITH TIME ZONE",
+    "next_refresh_at": "TIMESTAMP WITH TIME ZONE",
+    "refresh_interval": "INTEGER",
+}
+
+def run_migration():
+    with engine.connect() as connection:
+        for name, column_type in COLUMNS.items():
+            try:
+                print(f"Attempting to add {name}...")
+                connection.execute(text(f"ALTER TABLE students ADD COLUMN {name} {column_type}"))
+                connection.commit()
+                print(f"SUCCESS: {name} added.")
+            except Exception as e:
+                connection.rollback()
+                print(f"INFO: {name} might already exist or error: {e}")
+
+if __name__ == "__main__":
+    run_migration()
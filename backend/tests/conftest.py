@@ -0,0 +1,38 @@
+import os
+import tempfile
+
+# Point the app at throwaway files before it is imported
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_tmp, "test.db")
+os.environ["HTTP_CACHE_PATH"] = os.path.join(_tmp, "http_cache.json")
+
+import pytest
+from app.database import Base, SessionLocal, engine
+from app.models import Student
+from app.services.response_cache import DIRECTORY, RANKINGS, response_cache
+
+@pytest.fixture
+def db():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    response_cache.bump(DIRECTORY, RANKINGS)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+def make_students(db, count, sections="ABCD", start=0, **values):
+    students = [
+        Student(
+            roll_number=f"R{i:04d}",
+            email=f"student{i}@example.com",
+            name=f"Student {i}",
+            section=sections[i % len(sections)],
+            **values
+        )
+        for i in range(start, start + count)
+    ]
+    db.add_all(students)
+    db.commit()
+    return students
@@ -0,0 +1,60 @@
+import asyncio
+import json
+import httpx
+import pytest
+from app.services import circuit_breaker, github_service, leetcode_service
+
+class NoLimit:
+    async def acquire(self):
+        pass
+
+@pytest.fixture(autouse=True)
+def providers(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+    monkeypatch.setattr(github_service, "get_limiter", lambda name: NoLimit())
+    monkeypatch.setattr(leetcode_service, "get_limiter", lambda name: NoLimit())
+    monkeypatch.setattr(github_service, "GITHUB_TOKEN", "token")
+
+def run(fetch, usernames, handler):
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await fetch(usernames, client)
+    return asyncio.run(main())
+
+def test_github_batch_split_after_failure():
+    sizes = []
+
+    def handler(request):
+        variables = json.loads(request.content)["variables"]
+        sizes.append(len(variables))
+        if len(variables) > 20:
+            return httpx.Response(502)
+        data = {alias: {"contributionsCollection": {"totalCommitContributions": int(login[4:])}} for alias, login in variables.items()}
+        return httpx.Response(200, json={"data": data})
+
+    usernames = [f"user{i}" for i in range(50)]
+    results = run(github_service.get_github_commits_batch, usernames, handler)
+    assert results == {f"user{i}": i for i in range(50)}
+    assert sizes[0] == 50 and max(sizes[1:]) <= 25
+
+def test_github_rejected_query_split():
+    def handler(request):
+        variables = json.loads(request.content)["variables"]
+        if len(variables) > 10:
+            return httpx.Response(200, json={"data": None, "errors": [{"type": "MAX_NODE_LIMIT_EXCEEDED"}]})
+        data = {alias: {"contributionsCollection": {"totalCommitContributions": 1}} for alias in variables}
+        return httpx.Response(200, json={"data": data})
+
+    usernames = [f"user{i}" for i in range(30)]
+    assert len(run(github_service.get_github_commits_batch, usernames, handler)) == 30
+
+def test_leetcode_batch_split_after_timeout():
+    def handler(request):
+        variables = json.loads(request.content)["variables"]
+        if len(variables) > 5:
+            raise httpx.ReadTimeout("timed out", request=request)
+        data = {alias: {"submitStats": {"acSubmissionNum": [{"difficulty": "All", "count": 3}]}} for alias in variables}
+        return httpx.Response(200, json={"data": data})
+
+    usernames = [f"user{i}" for i in range(25)]
+    assert run(leetcode_service.get_leetcode_stats_batch, usernames, handler) == {u: 3 for u in usernames}
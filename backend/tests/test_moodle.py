@@ -0,0 +1,25 @@
+import asyncio
+import httpx
+import pytest
+from app.services import moodle_service
+from app.services.moodle_service import MoodleClient, MoodleUnavailableError
+
+def refused(request):
+    raise httpx.ConnectError("Connection refused", request=request)
+
+def server_error(request):
+    return httpx.Response(503, text="Site under maintenance")
+
+def wrong_password(request):
+    # The login form again, with no dashboard behind it
+    return httpx.Response(200, text='<title>Log in</title><input name="logintoken" value="token">')
+
+@pytest.mark.parametrize("handler", [refused, server_error])
+def test_login_outage_is_not_bad_credentials(monkeypatch, handler):
+    monkeypatch.setattr(moodle_service, "get_transport", lambda: httpx.MockTransport(handler))
+    with pytest.raises(MoodleUnavailableError):
+        asyncio.run(MoodleClient("user", "password").get_assignments())
+
+def test_login_rejected(monkeypatch):
+    monkeypatch.setattr(moodle_service, "get_transport", lambda: httpx.MockTransport(wrong_password))
+    assert asyncio.run(MoodleClient("user", "password").login()) is False
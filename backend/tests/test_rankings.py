@@ -0,0 +1,174 @@
+import asyncio
+import functools
+import random
+from sqlalchemy import select
+from app.database import AsyncSessionLocal
+from app.models import Student, StudentRanking
+from app.services import refresh_service
+from app.services.ranking_service import add_to_rankings, apply_rank_change, rebuild_rankings
+from app.services.stats_service import StatsWriter, save_stats
+from fastapi.testclient import TestClient
+from app.main import app
+from conftest import make_students
+
+def ranking_rows(db):
+    db.expire_all()
+    return sorted(
+        (r.student_id, r.metric, r.scope, r.value, r.rank, r.dense_rank)
+        for r in db.query(StudentRanking)
+    )
+
+def test_batched_sweep_keeps_rankings_in_step(db, monkeypatch):
+    rng = random.Random(7)
+    students = make_students(db, 60, github_username=None, leetcode_username=None)
+    for student in students:
+        student.github_username = f"gh{student.id}"
+        student.leetcode_username = f"lc{student.id}"
+        student.github_commits_count = rng.randint(0, 20)
+        student.leetcode_points = rng.randint(0, 20)
+    db.commit()
+    rebuild_rankings(db)
+    db.commit()
+
+    # New counts for most students, with ties, from mocked batch lookups
+    commits = {s.github_username: rng.randint(0, 20) if rng.random() < 0.8 else s.github_commits_count for s in students}
+    points = {s.leetcode_username: rng.randint(0, 20) if rng.random() < 0.8 else s.leetcode_points for s in students}
+    before = ranking_rows(db)
+
+    async def github_batch(usernames):
+        return {u: commits[u] for u in usernames}
+
+    async def leetcode_batch(usernames):
+        return {u: points[u] for u in usernames}
+
+    monkeypatch.setattr(refresh_service, "get_github_commits_batch", github_batch)
+    monkeypatch.setattr(refresh_service, "get_leetcode_stats_batch", leetcode_batch)
+    # Several flushes per sweep
+    monkeypatch.setattr(refresh_service, "StatsWriter", functools.partial(StatsWriter, batch_size=7))
+
+    async def sweep():
+        async with AsyncSessionLocal() as session:
+            loaded = (await session.execute(select(Student).order_by(Student.id))).scalars().all()
+            return await refresh_service.run_sweep(session, students=loaded)
+
+    summary = asyncio.run(sweep())
+    assert summary.succeeded == len(students)
+
+    incremental = ranking_rows(db)
+    assert incremental != before
+    rebuild_rankings(db)
+    db.commit()
+    assert incremental == ranking_rows(db)
+
+def test_repeated_and_stale_moves_match_rebuild(db):
+    students = make_students(db, 5, sections="A")
+    for student, commits in zip(students, (10, 12, 15, 20, 5)):
+        student.github_commits_count = commits
+    db.commit()
+    rebuild_rankings(db)
+    db.commit()
+
+    mover = students[0]
+    mover.github_commits_count = 15
+    # Two writers that both loaded the student at 10 apply the same 10 -> 15
+    apply_rank_change(db, mover, "github", 15)
+    apply_rank_change(db, mover, "github", 15)
+    db.commit()
+    # A third still holds the snapshot from before both
+    mover.github_commits_count = 11
+    apply_rank_change(db, mover, "github", 11)
+    db.commit()
+
+    incremental = ranking_rows(db)
+    assert max(row[4] for row in incremental) <= len(students)
+    rebuild_rankings(db)
+    db.commit()
+    assert incremental == ranking_rows(db)
+
+def test_writers_with_stale_snapshots_match_rebuild(db):
+    rng = random.Random(3)
+    make_students(db, 20, github_commits_count=10, leetcode_points=10)
+    rebuild_rankings(db)
+    db.commit()
+
+    async def writers():
+        # Both load the students before either writes, like a per-student
+        # refresh and a sweep (or two overlapping shards) in different workers
+        async with AsyncSessionLocal() as first, AsyncSessionLocal() as second:
+            loaded_first = (await first.execute(select(Student).order_by(Student.id))).scalars().all()
+            loaded_second = (await second.execute(select(Student).order_by(Student.id))).scalars().all()
+            await first.commit()
+            await second.commit()
+
+            for student in loaded_first[:12]:
+                await save_stats(first, student, rng.randint(5, 20), rng.randint(5, 20))
+            writer = StatsWriter(second, batch_size=5)
+            for student in loaded_second[6:]:
+                # Some repeat the first writer's move, some move elsewhere
+                await writer.add(student, rng.choice([student.github_commits_count, 15, rng.randint(0, 25)]), rng.randint(0, 25))
+            await writer.flush()
+
+    asyncio.run(writers())
+
+    incremental = ranking_rows(db)
+    rebuild_rankings(db)
+    db.commit()
+    assert incremental == ranking_rows(db)
+
+def test_added_students_match_rebuild(db):
+    rng = random.Random(5)
+    students = make_students(db, 12)
+    for student in students:
+        student.github_commits_count = rng.randint(0, 6)
+        student.leetcode_points = rng.randint(0, 6)
+    db.commit()
+    rebuild_rankings(db)
+    db.commit()
+
+    # Zero counts like a registration, and values already on the board
+    for i, student in enumerate(make_students(db, 4, start=12)):
+        student.github_commits_count = (0, 3, 9, 0)[i]
+        student.leetcode_points = (0, 6, 2, 7)[i]
+        add_to_rankings(db, student)
+        db.commit()
+
+    incremental = ranking_rows(db)
+    rebuild_rankings(db)
+    db.commit()
+    assert incremental == ranking_rows(db)
+
+def test_percentile_computed_from_board_size(db):
+    students = make_students(db, 4, sections="A")
+    for student, commits in zip(students, (5, 9, 5, 1)):
+        student.github_commits_count = commits
+    db.commit()
+    rebuild_rankings(db)
+    db.commit()
+
+    rows = TestClient(app).get("/api/rankings/github").json()
+    assert [(row["rank"], row["percentile"]) for row in rows] == [(1, 100.0), (2, 75.0), (2, 75.0), (4, 25.0)]
+
+def test_registration_ranks_new_student(db, monkeypatch):
+    students = make_students(db, 6, sections="AB")
+    for student, commits in zip(students, (4, 0, 7, 2, 0, 9)):
+        student.github_commits_count = commits
+    db.commit()
+    rebuild_rankings(db)
+    db.commit()
+
+    async def no_photo(email, github_username=None):
+        return None
+    monkeypatch.setattr("app.services.gmail_service.get_gmail_photo", no_photo)
+    response = TestClient(app).post("/api/auth/register", json={
+        "roll_number": "NEW001",
+        "email": "new@example.com",
+        "name": "New Student",
+        "section": "B",
+    })
+    assert response.status_code == 201, response.text
+
+    incremental = ranking_rows(db)
+    assert len(incremental) == 7 * 2 * 2
+    rebuild_rankings(db)
+    db.commit()
+    assert incremental == ranking_rows(db)
@@ -0,0 +1,20 @@
+from app.services.response_cache import DIRECTORY, RANKINGS, ResponseCache
+
+def test_bump_reaches_other_workers(db):
+    # Two processes' caches over the same database
+    first = ResponseCache(max_entries=10, ttl=300, sync_interval=0)
+    second = ResponseCache(max_entries=10, ttl=300, sync_interval=0)
+
+    first.set(DIRECTORY, "page", b"[]", first.generation(DIRECTORY))
+    first.set(RANKINGS, "board", b"[]", first.generation(RANKINGS))
+    assert first.get(DIRECTORY, "page") is not None
+
+    second.bump(DIRECTORY)
+    assert first.get(DIRECTORY, "page") is None
+    assert first.get(RANKINGS, "board") is not None
+
+def test_bump_is_immediate_locally(db):
+    cache = ResponseCache(max_entries=10, ttl=300, sync_interval=3600)
+    cache.set(DIRECTORY, "page", b"[]", cache.generation(DIRECTORY))
+    cache.bump(DIRECTORY)
+    assert cache.get(DIRECTORY, "page") is None
@@ -0,0 +1,21 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from conftest import make_students
+
+client = TestClient(app)
+
+def test_list_without_cursor(db):
+    make_students(db, 10)
+    response = client.get("/api/students/", params={"section": "A"})
+    assert response.status_code == 200
+    roll_numbers = [s["roll_number"] for s in response.json()]
+    assert roll_numbers == ["R0000", "R0004", "R0008"]
+
+def test_skip_and_cursor_pages_agree(db):
+    make_students(db, 10)
+    first = client.get("/api/students/", params={"limit": 4})
+    assert first.status_code == 200
+    by_cursor = client.get("/api/students/", params={"limit": 4, "after": first.headers["X-Next-Cursor"]})
+    by_skip = client.get("/api/students/", params={"limit": 4, "skip": 4})
+    assert by_cursor.json() == by_skip.json()
+    assert [s["roll_number"] for s in by_skip.json()] == ["R0004", "R0005", "R0006", "R0007"]
@@ -81,6 +81,12 @@ const MoodleDashboard = ({ rollNumber }) => {
                 </div>
             </div>
 
+            {assignments.moodle_down && (
+                <div className="px-4 py-2 bg-yellow-50 border-b-2 border-gray-900 text-xs font-bold text-yellow-800 uppercase">
+                    Moodle is unreachable - showing assignments from {Math.round(assignments.age_seconds / 60)} min ago
+                </div>
+            )}
+
             {/* List */}
             <div className="max-h-[300px] overflow-y-auto p-2 space-y-2">
                 {displayedAssignments.length === 0 ? (
@@ -175,7 +175,7 @@ const Rankings = () => {
                                     <RankingCard
                                         key={student.id}
                                         student={student}
-                                        rank={index + 1}
+                                        rank={student.rank ?? index + 1}
                                         type={activeTab}
                                     />
                                 ))